@@ -0,0 +1 @@
+"""Reproducible benchmarks for the lookup pipeline; run modules with `python -m benchmarks.<name>`."""
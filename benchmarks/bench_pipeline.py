@@ -0,0 +1,260 @@
+"""Throughput and latency of each stage of the lookup pipeline.
+
+    python -m benchmarks.bench_pipeline --count 20000 --json baseline.json
+    python -m benchmarks.bench_pipeline --count 20000 --compare baseline.json
+
+Everything runs offline against a StubGeocoder with a throwaway cache, history and
+export directory, so numbers depend only on the code and the machine. --compare prints
+the change against an earlier --json run and exits non-zero when any scenario's
+throughput dropped by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from phonelookup import PhoneLookup
+from phonelookup.cache import open_cache
+from phonelookup.config import Settings
+from phonelookup.core import MetadataMemo, _metadata, describe, enlarge_regex_cache
+from phonelookup.geocode import StubGeocoder
+from phonelookup.metrics import LatencyWindow, StageTimer
+
+from .corpus import synthetic_numbers
+
+
+class Bench:
+    """Shared state for one run: the corpus, a scratch directory and the results so far."""
+
+    def __init__(self, numbers, tmpdir, stub_latency, sample):
+        self.numbers = numbers
+        self.tmpdir = tmpdir
+        self.stub_latency = stub_latency
+        self.sample = sample
+        self.results = {}
+        self.lookups = None
+
+    def path(self, name):
+        return os.path.join(self.tmpdir, name)
+
+    def settings(self, index=None):
+        return Settings(cache_file=self.path("cache.db"), history_file=self.path("history.db"),
+                        legacy_cache_file=None, legacy_history_file=None, centroid_index_file=index)
+
+    def engine(self, index=None, timer=None):
+        # The scratch cache file is passed explicitly so later scenarios find it warm
+        settings = self.settings(index)
+        return PhoneLookup(settings, geocoder_api=StubGeocoder(latency=self.stub_latency), timer=timer,
+                           cache=open_cache(settings))
+
+    def record(self, name, items, seconds, latencies=None, timer=None):
+        result = {"items": items, "seconds": round(seconds, 4), "per_sec": round(items / seconds, 1) if seconds else None}
+        if latencies is not None:
+            result.update(latencies.summary())
+        if timer is not None:
+            result["stages"] = timer.to_dict()["stages"]
+        self.results[name] = result
+        latency = f"  p50 {result['p50_ms']:.3f}ms  p99 {result['p99_ms']:.3f}ms" if latencies is not None else ""
+        print(f"{name:<20} {items:>8} items {seconds:>8.3f}s {result['per_sec'] or 0:>11.0f}/s{latency}")
+
+
+def bench_describe(bench):
+    # Load the prefix data first so its one-off import isn't billed to the first scenario
+    _metadata()
+    numbers = list(dict.fromkeys(bench.numbers))
+    start = time.perf_counter()
+    for number in numbers:
+        describe(number)
+    bench.record("describe_unmemoized", len(numbers), time.perf_counter() - start)
+
+    memo = MetadataMemo()
+    start = time.perf_counter()
+    for number in bench.numbers:
+        describe(number, memo=memo)
+    bench.record("describe_memoized", len(bench.numbers), time.perf_counter() - start)
+
+
+def bench_prefilter(bench):
+    # Metadata only, so the difference is parsing and dedup rather than geocoding
+    for name, prefilter in (("metadata_only", False), ("metadata_prefiltered", True)):
+        timer = StageTimer()
+        engine = PhoneLookup(bench.settings(), geocode=False, timer=timer)
+        start = time.perf_counter()
+        count = sum(1 for _ in engine.lookup_many(bench.numbers, prefilter=prefilter))
+        bench.record(name, count, time.perf_counter() - start, timer=timer)
+        engine.close()
+
+
+def bench_lookup_many(bench):
+    for name in ("lookup_many_cold", "lookup_many_warm"):
+        timer = StageTimer()
+        engine = bench.engine(timer=timer)
+        start = time.perf_counter()
+        results = list(engine.lookup_many(bench.numbers))
+        bench.record(name, len(results), time.perf_counter() - start, timer=timer)
+        engine.close()
+    bench.lookups = results
+
+
+def bench_lookup_single(bench):
+    engine = bench.engine()
+    latencies = LatencyWindow(bench.sample)
+    start = time.perf_counter()
+    for number in bench.numbers[:bench.sample]:
+        t = time.perf_counter()
+        engine.lookup(number)
+        latencies.add(time.perf_counter() - t)
+    bench.record("lookup_single", min(bench.sample, len(bench.numbers)), time.perf_counter() - start, latencies)
+    engine.close()
+
+
+def bench_index(bench):
+    from phonelookup.centroids import write_index
+    entries = [(r.region, r.detailed_location or r.country, r.lat, r.lng, r.confidence)
+               for r in bench.lookups if r.ok]
+    index_file = bench.path("centroids.idx")
+    write_index(index_file, entries)
+    timer = StageTimer()
+    engine = bench.engine(index_file, timer)
+    start = time.perf_counter()
+    count = sum(1 for _ in engine.lookup_many(bench.numbers))
+    bench.record("lookup_many_index", count, time.perf_counter() - start, timer=timer)
+    engine.close()
+
+
+def bench_writers(bench):
+    from phonelookup.writers import open_writer
+    formats = ["csv", "ndjson"]
+    try:
+        import pyarrow  # noqa: F401
+        formats += ["parquet", "arrow"]
+    except ImportError:
+        pass
+    for format in formats:
+        start = time.perf_counter()
+        with open_writer(bench.path(f"export.{format}"), format, append=False) as writer:
+            for result in bench.lookups:
+                writer.write(result)
+        bench.record(f"write_{format}", len(bench.lookups), time.perf_counter() - start)
+
+
+def bench_history(bench):
+    from phonelookup.history import HistoryStore
+    from phonelookup.maps import save_history_map
+    history = HistoryStore(bench.path("history.db"))
+    ok = [result for result in bench.lookups if result.ok][:bench.sample]
+    latencies = LatencyWindow(bench.sample)
+    start = time.perf_counter()
+    for r in ok:
+        t = time.perf_counter()
+        history.record(r.number, r.country, r.detailed_location, r.service_provider, r.time_zone, r.lat, r.lng,
+                       r.number_type)
+        latencies.add(time.perf_counter() - t)
+    bench.record("history_record", len(ok), time.perf_counter() - start, latencies)
+
+    start = time.perf_counter()
+    save_history_map(history, bench.path("history_map.html"))
+    bench.record("history_map", len(ok), time.perf_counter() - start)
+    history.close()
+
+
+def bench_single_map(bench):
+    import folium
+    from phonelookup.maps import save_location_map
+    ok = [result for result in bench.lookups if result.ok][:bench.sample]
+    latencies = LatencyWindow(len(ok))
+    start = time.perf_counter()
+    for r in ok:
+        t = time.perf_counter()
+        save_location_map(bench.path("mylocation.html"), r)
+        latencies.add(time.perf_counter() - t)
+    bench.record("single_map", len(ok), time.perf_counter() - start, latencies)
+
+    # The folium equivalent, for reference; it is slow enough that a handful of maps will do
+    ok = ok[:20]
+    latencies = LatencyWindow(len(ok))
+    start = time.perf_counter()
+    for r in ok:
+        t = time.perf_counter()
+        myMap = folium.Map(location=[r.lat, r.lng], zoom_start=9)
+        folium.Marker([r.lat, r.lng], popup=r.query).add_to(myMap)
+        myMap.save(bench.path("mylocation.html"))
+        latencies.add(time.perf_counter() - t)
+    bench.record("single_map_folium", len(ok), time.perf_counter() - start, latencies)
+
+
+# Order matters: later scenarios reuse the results of lookup_many
+SCENARIOS = {
+    "describe": bench_describe,
+    "prefilter": bench_prefilter,
+    "lookup_many": bench_lookup_many,
+    "lookup_single": bench_lookup_single,
+    "index": bench_index,
+    "writers": bench_writers,
+    "history": bench_history,
+    "single_map": bench_single_map,
+}
+
+
+def compare(results, baseline, tolerance):
+    """Print throughput changes against `baseline`, returning the scenarios that regressed."""
+    regressed = []
+    print(f"\n{'scenario':<20} {'baseline/s':>11} {'now/s':>11} {'change':>8}")
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name, {}).get("per_sec")
+        if not before or not result["per_sec"]:
+            continue
+        change = result["per_sec"] / before - 1
+        flag = "  REGRESSION" if change < -tolerance else ""
+        if flag:
+            regressed.append(name)
+        print(f"{name:<20} {before:>11.0f} {result['per_sec']:>11.0f} {change:>+7.1%}{flag}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=20000, help="numbers in the synthetic corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--regions", help="comma-separated region codes for the corpus (default: all)")
+    parser.add_argument("--duplicate-rate", type=float, default=0.2, help="fraction of repeated numbers")
+    parser.add_argument("--sample", type=int, default=2000, help="items for the per-call latency scenarios")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="seconds each stub geocoder call takes")
+    parser.add_argument("--only", nargs="+", choices=sorted(SCENARIOS), help="run only these scenario groups")
+    parser.add_argument("--json", metavar="FILE", help="save the results for a later --compare")
+    parser.add_argument("--compare", metavar="FILE", help="compare against results saved with --json")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="throughput drop counted as a regression (default: 0.1 = 10%%)")
+    args = parser.parse_args(argv)
+
+    # Measure the pipeline as the batch and server entry points run it
+    enlarge_regex_cache()
+    regions = set(args.regions.upper().split(",")) if args.regions else None
+    numbers = synthetic_numbers(args.count, args.seed, regions, args.duplicate_rate)
+    print(f"{len(numbers)} numbers ({len(set(numbers))} distinct), seed {args.seed}, "
+          f"stub latency {args.stub_latency * 1000:.0f}ms")
+    with tempfile.TemporaryDirectory(prefix="phonelookup-bench-") as tmpdir:
+        bench = Bench(numbers, tmpdir, args.stub_latency, args.sample)
+        selected = set(args.only or SCENARIOS)
+        if selected & {"index", "writers", "history", "single_map"}:
+            selected.add("lookup_many")
+        for name, scenario in SCENARIOS.items():
+            if name in selected:
+                scenario(bench)
+
+    report = {"config": {key: value for key, value in vars(args).items() if key not in ("json", "compare")},
+              "results": bench.results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressed = compare(bench.results, json.load(f), args.tolerance)
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
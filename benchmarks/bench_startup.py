@@ -0,0 +1,114 @@
+"""Start-up cost: import times and first-lookup latency in a fresh process, cold vs warmed up.
+
+    python -m benchmarks.bench_startup --repeat 5 --regions ZA,US,GB,IN
+    python -m benchmarks.bench_startup --json startup.json
+
+Every measurement runs in a new interpreter, so nothing is loaded yet. "cold" looks
+numbers up straight away, as the apps used to; "warm_metadata" and "warm_regions" call
+core.warm_up() first (without and with the corpus' regions) and report its cost
+separately. Medians over --repeat runs are printed.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+import phonenumbers
+
+from .corpus import synthetic_numbers
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in the child: only json, sys and time are loaded before the clock starts
+_LOOKUP_CHILD = """
+import json, sys, time
+numbers, regions, warm = json.load(sys.stdin)
+start = time.perf_counter()
+from phonelookup.core import describe, warm_up
+imported = time.perf_counter()
+if warm:
+    warm_up(regions if warm == "regions" else None)
+warmed = time.perf_counter()
+seen = set()
+first_in_region = []
+later = []
+for number, region in numbers:
+    t = time.perf_counter()
+    describe(number)
+    elapsed = time.perf_counter() - t
+    (later if region in seen else first_in_region).append(elapsed)
+    seen.add(region)
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "warm_up_ms": (warmed - imported) * 1000,
+    "first_ms": first_in_region[0] * 1000,
+    "first_in_region_ms": sum(first_in_region[1:]) / max(len(first_in_region) - 1, 1) * 1000,
+    "steady_ms": sorted(later)[len(later) // 2] * 1000 if later else None,
+}))
+"""
+
+_IMPORT_CHILD = """
+import json, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"import_ms": (time.perf_counter() - start) * 1000}}))
+"""
+
+LOOKUP_SCENARIOS = {"cold": None, "warm_metadata": "metadata", "warm_regions": "regions"}
+IMPORTS = ["phonelookup", "main", "gui"]
+
+
+def run_child(code, stdin=None):
+    output = subprocess.run([sys.executable, "-c", code], input=stdin, capture_output=True, text=True, cwd=ROOT,
+                            check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def median_of(runs):
+    return {key: round(statistics.median(run[key] for run in runs), 3)
+            for key in runs[0] if all(run[key] is not None for run in runs)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200, help="numbers looked up per process")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--regions", default="ZA,US,GB,DE,IN,BR,NG,KE",
+                        help="comma-separated region codes for the corpus and warm-up")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh processes per scenario")
+    parser.add_argument("--json", metavar="FILE", help="save the results")
+    args = parser.parse_args(argv)
+
+    regions = [region.strip().upper() for region in args.regions.split(",") if region.strip()]
+    numbers = synthetic_numbers(args.count, args.seed, set(regions), duplicate_rate=0)
+    tagged = [(number, phonenumbers.region_code_for_number(phonenumbers.parse(number))) for number in numbers]
+    results = {}
+
+    print(f"{'import':<20} {'ms':>10}")
+    for module in IMPORTS:
+        try:
+            runs = [run_child(_IMPORT_CHILD.format(module=module)) for _ in range(args.repeat)]
+        except subprocess.CalledProcessError as e:
+            print(f"{module:<20} {'skipped':>10}  ({e.stderr.strip().splitlines()[-1]})")
+            continue
+        results[f"import_{module}"] = median_of(runs)
+        print(f"{module:<20} {results[f'import_{module}']['import_ms']:>10.1f}")
+
+    print(f"\n{'lookup':<20} {'warm-up ms':>11} {'first ms':>10} {'new region ms':>14} {'steady ms':>10}")
+    for name, warm in LOOKUP_SCENARIOS.items():
+        stdin = json.dumps([tagged, regions, warm])
+        result = median_of([run_child(_LOOKUP_CHILD, stdin) for _ in range(args.repeat)])
+        results[name] = result
+        print(f"{name:<20} {result['warm_up_ms']:>11.1f} {result['first_ms']:>10.2f} "
+              f"{result['first_in_region_ms']:>14.2f} {result.get('steady_ms', 0):>10.3f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": {key: value for key, value in vars(args).items() if key != "json"},
+                       "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
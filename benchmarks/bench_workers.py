@@ -0,0 +1,45 @@
+"""Measure describe throughput of lookup_many for different --workers settings.
+
+    python -m benchmarks.bench_workers --count 200000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import time
+
+from phonelookup import PhoneLookup
+from phonelookup.core import enlarge_regex_cache
+
+from .corpus import synthetic_numbers
+
+
+def run(numbers, workers):
+    engine = PhoneLookup(geocode=False)
+    start = time.perf_counter()
+    count = sum(1 for _ in engine.lookup_many(numbers, workers=workers))
+    return count, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100000, help="numbers in the synthetic corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--duplicate-rate", type=float, default=0.0,
+                        help="fraction of repeated numbers (default 0, so the memo doesn't mask parsing cost)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args(argv)
+    # As the batch entry point does
+    enlarge_regex_cache()
+
+    numbers = synthetic_numbers(args.count, args.seed, duplicate_rate=args.duplicate_rate)
+    print(f"{len(numbers)} numbers, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'seconds':>9} {'numbers/s':>11} {'speedup':>8}")
+    baseline = None
+    for workers in sorted(set(args.workers)):
+        count, elapsed = run(numbers, workers)
+        rate = count / elapsed
+        baseline = baseline or rate
+        print(f"{workers:>8} {elapsed:>9.2f} {rate:>11.0f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import random
+
+import phonenumbers
+from phonenumbers import PhoneNumberFormat, PhoneNumberType
+
+
+def synthetic_numbers(count, seed=0, regions=None, duplicate_rate=0.2, randomized_digits=4):
+    """Return `count` plausible E.164 numbers spread across many regions.
+
+    Numbers are derived from the metadata's example fixed-line and mobile numbers with
+    their last digits randomized, and `duplicate_rate` of them repeat an earlier number,
+    so the corpus exercises validation, prefix sharing and repeats the way real feeds do.
+    """
+    rng = random.Random(seed)
+    templates = []
+    for region in sorted(regions or phonenumbers.SUPPORTED_REGIONS):
+        for number_type in (PhoneNumberType.FIXED_LINE, PhoneNumberType.MOBILE):
+            example = phonenumbers.example_number_for_type(region, number_type)
+            if example is not None:
+                templates.append(phonenumbers.format_number(example, PhoneNumberFormat.E164))
+    numbers = []
+    for _ in range(count):
+        if numbers and rng.random() < duplicate_rate:
+            numbers.append(rng.choice(numbers))
+            continue
+        template = rng.choice(templates)
+        digits = min(randomized_digits, len(template) - 4)
+        numbers.append(template[:-digits] + "".join(rng.choice("0123456789") for _ in range(digits)))
+    return numbers
+
+
+def write_corpus(path, count, seed=0, regions=None):
+    with open(path, "w", encoding="utf-8") as f:
+        for number in synthetic_numbers(count, seed, regions):
+            f.write(number + "\n")
@@ -0,0 +1,79 @@
+"""Lookup history dashboard.
+
+    streamlit run dashboard.py
+
+Every chart reads the aggregates HistoryStore keeps up to date as lookups are recorded,
+never the history rows themselves, and is cached with st.cache_data under the history
+watermark: reruns cost a couple of indexed reads until new lookups arrive, and then
+only the small aggregate tables are read again.
+"""
+import pandas as pd
+import streamlit as st
+from streamlit_folium import st_folium
+
+from phonelookup.history import open_history
+from phonelookup.maps import MAP_MODES, history_map
+
+CHARTS = [
+    ("country", "Country"),
+    ("service_provider", "Carrier"),
+    ("number_type", "Number type"),
+    ("time_zone", "Time zone"),
+]
+
+
+@st.cache_resource
+def get_history():
+    return open_history()
+
+
+@st.cache_data(max_entries=32)
+def load_counts(watermark, dimension, limit=None):
+    # `watermark` is only part of the cache key: a new lookup changes it and misses the cache
+    rows = get_history().counts(dimension, limit)
+    return pd.DataFrame(rows, columns=["value", "count"]).set_index("value")
+
+
+@st.cache_data(max_entries=4)
+def load_places(watermark):
+    return list(get_history().places())
+
+
+def main():
+    st.set_page_config(page_title="Phone lookup history", layout="wide")
+    st.title("Phone lookup history")
+    history = get_history()
+    watermark = history.watermark()
+    total = watermark[1]
+    if not total:
+        st.info("No lookups recorded yet.")
+        return
+
+    top = st.sidebar.slider("Values per chart", 5, 50, 15)
+    mode = st.sidebar.selectbox("Map", MAP_MODES)
+    st.sidebar.button("Refresh")
+
+    countries = load_counts(watermark, "country")
+    places = load_places(watermark)
+    first, second, third = st.columns(3)
+    first.metric("Lookups", f"{total:,}")
+    second.metric("Countries", f"{len(countries):,}")
+    third.metric("Places on the map", f"{len(places):,}")
+
+    st.subheader("Lookups per day")
+    st.line_chart(load_counts(watermark, "day"))
+
+    for row in range(0, len(CHARTS), 2):
+        for column, (dimension, title) in zip(st.columns(2), CHARTS[row:row + 2]):
+            column.subheader(title)
+            column.bar_chart(load_counts(watermark, dimension, top))
+
+    st.subheader("Map")
+    myMap = history_map(places, mode)
+    if myMap is None:
+        st.caption("No lookups with coordinates yet.")
+    else:
+        st_folium(myMap, use_container_width=True, returned_objects=[])
+
+
+main()
@@ -1,125 +1,153 @@
-import phonenumbers
-from phonenumbers import geocoder, carrier, timezone, number_type
-from opencage.geocoder import OpenCageGeocode
-import folium
-from dotenv import load_dotenv
-import os
+import queue
+import threading
 import tkinter as tk
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import messagebox, scrolledtext
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 import webbrowser
-import json
-import csv
-from datetime import datetime
 import re
-import pyperclip
-import requests
-
-response = requests.get("https://api.ipgeolocation.io/ipgeo?apiKey=YOUR_API_KEY&ip=8.8.8.8")
-
-# Load environment variables
-load_dotenv()
-key = os.getenv("OPENCAGE_API_KEY")
-if not key:
-    messagebox.showerror("Error", "OPENCAGE_API_KEY not found in .env file")
-    exit()
-
-# Load or initialize cache
-cache_file = "geocode_cache.json"
-try:
-    with open(cache_file, "r") as f:
-        content = f.read().strip()
-        cache = json.loads(content) if content else {}
-except (FileNotFoundError, json.JSONDecodeError):
-    cache = {}
-
-def save_cache():
-    with open(cache_file, "w") as f:
-        json.dump(cache, f, indent=4)
-
-# Load or initialize history
-history_file = "history.json"
-try:
-    with open(history_file, "r") as f:
-        content = f.read().strip()
-        history = json.loads(content) if content else []
-except (FileNotFoundError, json.JSONDecodeError):
-    history = []
-
-def save_history(number, location, detailed_location, service_provider, time_zone, lat, lng, number_type_str, ip_location=None):
-    entry = {
-        "number": number,
-        "country": location,
-        "detailed_location": detailed_location if detailed_location else "Not available",
-        "service_provider": service_provider if service_provider else "Unknown",
-        "time_zone": str(time_zone) if time_zone else "Unknown",
-        "latitude": lat,
-        "longitude": lng,
-        "number_type": number_type_str,
-        "ip_location": ip_location if ip_location else "Not retrieved",
-        "timestamp": datetime.now().isoformat()
-    }
-    history.append(entry)
-    with open(history_file, "w") as f:
-        json.dump(history, f, indent=4)
+from phonelookup import get_lookup
+from phonelookup.config import get_settings
+from phonelookup.core import start_warm_up
+from phonelookup.history import HistoryFilter, open_history
+from phonelookup.maps import HistoryMapFile, save_location_map
+from phonelookup.metrics import write_metrics
+from phonelookup.writers import open_writer
+
+# Created in main() so importing this module has no side effects
+engine = None
+history = None
+history_map = None
+exporter = None
+
+# Lookups run on one background thread so they finish in the order they were queued and
+# never write mylocation.html at the same time; the IP location is fetched on a second
+# thread, once per session. Workers never touch Tk: they post messages to `messages`,
+# which the Tk thread drains every POLL_MS.
+lookup_executor = None
+ip_executor = None
+messages = queue.Queue()
+pending_jobs = deque()
+POLL_MS = 50
+
+# The history view filters as you type, but only after the typing pauses for FILTER_DELAY_MS,
+# and shows one page of HISTORY_PAGE_SIZE entries at a time. The store is queried on its
+# own thread (the only one touching history_filter) and pages come back via `messages`;
+# history_request numbers each request so a slow, superseded one is never shown
+history_executor = None
+history_filter = None
+history_page = 0
+history_request = 0
+filter_after_id = None
+FILTER_DELAY_MS = 250
+HISTORY_PAGE_SIZE = 50
+
+class LookupJob:
+    def __init__(self, number, style, include_ip, show_map):
+        self.number = number
+        self.style = style
+        self.include_ip = include_ip
+        self.show_map = show_map
+        self.cancelled = threading.Event()
+        self.future = None
+
+def save_history(result, ip_location=None):
+    entry = history.record(result.number, result.country, result.detailed_location, result.service_provider,
+                   result.time_zone, result.lat, result.lng, result.number_type, ip_location)
+    history_executor.submit(history_filter.invalidate)
+    history_map.append(entry)
+
+def schedule_filter(event=None):
+    # Debounce: restart the timer on every keystroke and filter once typing pauses
+    global filter_after_id
+    if filter_after_id is not None:
+        root.after_cancel(filter_after_id)
+    filter_after_id = root.after(FILTER_DELAY_MS, lambda: view_history(filter_entry.get()))
 
 def view_history(filter_text=""):
-    history_text.delete(1.0, tk.END)
-    if not history:
-        history_text.insert(tk.END, "No history available.")
+    global filter_after_id
+    filter_after_id = None
+    request_history_page(0, filter_text)
+
+def show_history_page(page):
+    # The filter still holds the matches for the current text, so turning a page is cheap
+    request_history_page(page, filter_entry.get())
+
+def request_history_page(page, filter_text):
+    global history_request
+    history_request += 1
+    history_executor.submit(load_history_page, history_request, page, filter_text)
+
+def load_history_page(request, page, filter_text):
+    # Runs on the history thread; skips requests already superseded by a newer one
+    if request != history_request:
         return
-    filtered_history = history
-    if filter_text:
-        filtered_history = [
-            entry for entry in history
-            if filter_text.lower() in entry["number"].lower() or filter_text.lower() in entry["country"].lower()
-        ]
-    if not filtered_history:
-        history_text.insert(tk.END, f"No history entries match '{filter_text}'.")
+    try:
+        history_filter.update(filter_text)
+        total = len(history_filter)
+        pages = max(1, -(-total // HISTORY_PAGE_SIZE))
+        page = max(0, min(page, pages - 1))
+        entries = history_filter.page(page, HISTORY_PAGE_SIZE)
+        messages.put(("history", None, (request, page, pages, total, history_filter.query, entries)))
+    except Exception as e:
+        messages.put(("status", None, f"History error: {e}"))
+
+def render_history_page(request, page, pages, total, query, entries):
+    global history_page
+    if request != history_request:
         return
-    for entry in filtered_history:
-        history_text.insert(tk.END, f"Number: {entry['number']} ({entry['number_type']}), Time: {entry['timestamp']}\n")
-        history_text.insert(tk.END, f"Country: {entry['country']}, Location: {entry['detailed_location']}\n")
-        history_text.insert(tk.END, f"Provider: {entry['service_provider']}, Time Zone: {entry['time_zone']}\n")
-        history_text.insert(tk.END, f"Coordinates: ({entry['latitude']}, {entry['longitude']})\n")
-        history_text.insert(tk.END, f"IP Location: {entry['ip_location']}\n\n")
+    history_page = page
+    # Build the page as one string so the widget gets a single insert
+    lines = []
+    for entry in entries:
+        lines.append(f"Number: {entry['number']} ({entry['number_type']}), Time: {entry['timestamp']}\n"
+                     f"Country: {entry['country']}, Location: {entry['detailed_location']}\n"
+                     f"Provider: {entry['service_provider']}, Time Zone: {entry['time_zone']}\n"
+                     f"Coordinates: ({entry['latitude']}, {entry['longitude']})\n"
+                     f"IP Location: {entry['ip_location']}\n\n")
+    if not lines:
+        lines.append(f"No history entries match '{query}'." if query else "No history available.")
+    history_text.delete(1.0, tk.END)
+    history_text.insert(tk.END, "".join(lines))
+    history_page_var.set(f"Page {history_page + 1} of {pages} ({total} entries)")
 
 def view_history_map():
-    if not history:
-        messagebox.showinfo("Info", "No history available to map.")
-        return
-    first_entry = history[0]
-    myMap = folium.Map(location=[first_entry["latitude"], first_entry["longitude"]], zoom_start=3)
-    for entry in history:
-        folium.Marker(
-            [entry["latitude"], entry["longitude"]],
-            popup=f"{entry['number']} ({entry['detailed_location']}, {entry['country']}), IP: {entry['ip_location']}",
-            icon=folium.Icon(color="blue")
-        ).add_to(myMap)
-    myMap.save("history_map.html")
-    status_var.set("History map saved as history_map.html")
-    webbrowser.open("history_map.html")
+    # Rendering a large history takes a moment, so it is queued behind any running lookups
+    status_var.set("Rendering history map...")
+    lookup_executor.submit(render_history_map)
+
+def render_history_map():
+    # Runs on the lookup thread
+    try:
+        # New lookups are appended to the map's data file, so this only rebuilds when needed
+        if not history_map.save(history):
+            messages.put(("info", None, "No history available to map."))
+            return
+        webbrowser.open("history_map.html")
+        messages.put(("status", None, "History map saved as history_map.html"))
+    except Exception as e:
+        messages.put(("status", None, f"History map error: {e}"))
 
 def clear_history():
-    global history
-    history = []
-    with open(history_file, "w") as f:
-        json.dump(history, f, indent=4)
-    status_var.set("History cleared.")
-    view_history()
-
-def export_to_csv(number, location, detailed_location, service_provider, time_zone, lat, lng, number_type_str, ip_location=None):
-    filename = "phone_lookup_export.csv"
-    file_exists = os.path.isfile(filename)
-    with open(filename, "a", newline="") as f:
-        writer = csv.writer(f)
-        if not file_exists:
-            writer.writerow(["Phone Number", "Country", "Detailed Location", "Service Provider", "Time Zone", "Latitude", "Longitude", "Number Type", "IP Location", "Timestamp"])
-        writer.writerow([number, location, detailed_location if detailed_location else "N/A", 
-                        service_provider if service_provider else "N/A", str(time_zone) if time_zone else "N/A", 
-                        lat, lng, number_type_str, ip_location if ip_location else "N/A", datetime.now().isoformat()])
-    status_var.set(f"Results exported to {filename}")
+    # Queued behind running lookups, so none of them saves into the history being cleared
+    status_var.set("Clearing history...")
+    lookup_executor.submit(run_clear_history)
+
+def run_clear_history():
+    # Runs on the lookup thread
+    try:
+        history.clear()
+        history_map.reset()
+        history_executor.submit(history_filter.invalidate)
+        messages.put(("status", None, "History cleared."))
+        messages.put(("history_cleared", None, None))
+    except Exception as e:
+        messages.put(("status", None, f"History error: {e}"))
+
+def export_result(result, ip_location=None):
+    exporter.write(result, ip_location)
 
 def clear_results():
     result_text.delete(1.0, tk.END)
@@ -128,6 +156,7 @@ def clear_results():
 
 def copy_map_url():
     if map_url_var.get():
+        import pyperclip
         pyperclip.copy(map_url_var.get())
         status_var.set("Map URL copied to clipboard.")
     else:
@@ -147,196 +176,265 @@ def validate_phone_number(*args):
         status_var.set("Phone number format looks good.")
 
 def get_ip_location(): # IP Address location
-    try:
-        status_var.set("Fetching IP location...")
-        root.update()
-        response = requests.get("http://ip-api.com/json/", timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        if data["status"] == "success":
-            city = data.get("city", "Unknown")
-            region = data.get("regionName", "Unknown")
-            country = data.get("country", "Unknown")
-            return f"{city}, {region}, {country}"
-        else:
-            return "Unknown (IP-API failed)"
-    except Exception as e:
-        status_var.set(f"IP location error: {str(e)}")
-        return "Unknown (error fetching IP location)"
+    # Answered from memory after the first call; the engine refreshes it in the background
+    # once it's older than PHONELOOKUP_IP_LOCATION_TTL
+    locator = engine.ip_locator
+    with engine.timer.stage("ip_location"):
+        location, coords = locator.get()
+    if locator.error:
+        messages.put(("status", None, f"IP location error: {locator.error}"))
+    return location, coords
+
+def prefetch_ip_location():
+    # Start resolving as soon as the option is ticked so the first lookup doesn't wait for it
+    if ip_location_var.get():
+        ip_executor.submit(get_ip_location)
 
 def track_number():
     number = entry.get().strip()
     if not number.startswith("+"):
         messagebox.showerror("Error", "Phone number must include country code (e.g., +1 for USA).")
         return
+    # Read the Tk variables here; the worker only sees the job
+    job = LookupJob(number, map_style.get(), ip_location_var.get(), show_map_var.get())
+    job.future = lookup_executor.submit(run_lookup, job)
+    pending_jobs.append(job)
+    update_progress(f"Queued {number}.")
+
+def run_lookup(job):
+    # Runs on the lookup thread: everything slow happens here, results go back via `messages`
     try:
-        pepnumber = phonenumbers.parse(number)
-        if not phonenumbers.is_valid_number(pepnumber):
-            messagebox.showerror("Error", "Invalid phone number.")
+        ip_future = ip_executor.submit(get_ip_location) if job.include_ip else None
+        messages.put(("status", job, f"Looking up {job.number}..."))
+        result = engine.lookup(job.number)
+        ip_location, ip_coords = ip_future.result() if ip_future else (None, None)
+        if job.cancelled.is_set():
+            return
+        if result.ok:
+            # Saving waits on SQLite and the export file, so it stays off the Tk thread too
+            with engine.timer.stage("history"):
+                save_history(result, ip_location)
+            with engine.timer.stage("export"):
+                export_result(result, ip_location)
+        # Show the result straight away; the map is a separate, optional step after it
+        messages.put(("result", job, (result, ip_location)))
+        if not result.ok or not job.show_map:
             return
 
-        status_var.set("Processing phone number...")
-        root.update()
-
-        # Get location details
-        location = geocoder.country_name_for_number(pepnumber, "en")
-        detailed_location = geocoder.description_for_number(pepnumber, "en")
-        service_provider = carrier.name_for_number(pepnumber, "en")
-        time_zone = timezone.time_zones_for_number(pepnumber)
-        number_type_id = number_type(pepnumber)
-        number_type_str = {0: "Unknown", 1: "Fixed line", 2: "Mobile", 3: "Fixed line or mobile"}.get(number_type_id, "Other")
-
-        # Build geocoding query
-        query = detailed_location if detailed_location else location
-        if detailed_location and location:
-            query = f"{detailed_location}, {location}"
-
-        # Check cache
-        if query in cache:
-            lat, lng = cache[query]["lat"], cache[query]["lng"]
-            confidence = cache[query].get("confidence", "N/A")
-            status_var.set("Using cached coordinates.")
-        else:
-            try:
-                geocoder_api = OpenCageGeocode(key)
-                results = geocoder_api.geocode(query)
-                if results and len(results):
-                    lat = results[0]["geometry"]["lat"]
-                    lng = results[0]["geometry"]["lng"]
-                    confidence = results[0].get("confidence", "N/A")
-                    cache[query] = {"lat": lat, "lng": lng, "confidence": confidence}
-                    save_cache()
-                else:
-                    messagebox.showerror("Error", "Geocoding failed, no coordinates found.")
-                    status_var.set("")
-                    return
-            except Exception as e:
-                messagebox.showerror("Error", f"Geocoding error: {str(e)}")
-                status_var.set("")
-                return
-
-        # Get IP location if enabled
-        ip_location = None
-        if ip_location_var.get():
-            ip_location = get_ip_location()
-
-        # Save to history and export
-        save_history(number, location, detailed_location, service_provider, time_zone, lat, lng, number_type_str, ip_location)
-        export_to_csv(number, location, detailed_location, service_provider, time_zone, lat, lng, number_type_str, ip_location)
-
-        # Update result text
-        result_text.delete(1.0, tk.END)
-        result_text.insert(tk.END, f"Phone Number: {number}\n", "bold")
-        result_text.insert(tk.END, f"Type: {number_type_str}\n")
-        result_text.insert(tk.END, f"Country and Location: {location} in {detailed_location if detailed_location else 'Not available'}\n")
-        result_text.insert(tk.END, f"Service Provider: {service_provider if service_provider else 'Unknown'}\n")
-        result_text.insert(tk.END, f"Time Zone: {time_zone if time_zone else 'Unknown'}\n")
-        result_text.insert(tk.END, f"Latitude and Longitude: {lat}, {lng}\n")
-        result_text.insert(tk.END, f"Geocoding Confidence: {confidence}\n")
-        if ip_location:
-            result_text.insert(tk.END, f"IP Location: {ip_location}\n")
-        result_text.insert(tk.END, f"Map URL: https://www.google.com/maps/place/{lat},{lng}\n", "link")
-        map_url_var.set(f"https://www.google.com/maps/place/{lat},{lng}")
-
-        # Configure text tags
-        result_text.tag_configure("bold", font=("Helvetica", 10, "bold"))
-        result_text.tag_configure("link", foreground="blue", underline=1)
-        result_text.tag_bind("link", "<Button-1>", lambda e: webbrowser.open(map_url_var.get()))
-
-        # Create and save map
-        tiles = "OpenStreetMap"
-        if map_style.get() == "satellite":
-            tiles = "https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}"
-        elif map_style.get() == "terrain":
-            tiles = "https://server.arcgisonline.com/ArcGIS/rest/services/World_Topo_Map/MapServer/tile/{z}/{y}/{x}"
-
-        zoom_level = 9 if detailed_location else 5
-        myMap = folium.Map(location=[lat, lng], zoom_start=zoom_level, tiles=tiles, attr="Map data © OpenStreetMap contributors, Esri")
-        folium.Marker([lat, lng], popup=query).add_to(myMap)
-        if ip_location and ip_location != "Unknown (error fetching IP location)":
-            try:
-                ip_results = geocoder_api.geocode(ip_location)
-                if ip_results and len(ip_results):
-                    ip_lat = ip_results[0]["geometry"]["lat"]
-                    ip_lng = ip_results[0]["geometry"]["lng"]
-                    folium.Marker([ip_lat, ip_lng], popup=f"IP Location: {ip_location}", icon=folium.Icon(color="green")).add_to(myMap)
-            except:
-                pass  # Skip IP marker if geocoding fails
-        myMap.save("mylocation.html")
+        messages.put(("status", job, f"Rendering map for {job.number}..."))
+        secondary = (ip_coords["lat"], ip_coords["lng"], f"IP Location: {ip_location}") if ip_coords else None
+        if job.cancelled.is_set():
+            return
+        with engine.timer.stage("map"):
+            save_location_map("mylocation.html", result, job.style, secondary)
         webbrowser.open("mylocation.html")
-        status_var.set("Map saved as mylocation.html")
+        messages.put(("status", job, f"{result.number}: map saved as mylocation.html"))
+    except Exception as e:
+        messages.put(("error", job, f"Lookup error: {e}"))
+    finally:
+        messages.put(("done", job, None))
 
-    except phonenumbers.NumberParseException:
+def poll_messages():
+    # Runs on the Tk thread every POLL_MS; only does cheap widget updates
+    try:
+        while True:
+            kind, job, payload = messages.get_nowait()
+            if job is not None and job.cancelled.is_set():
+                continue
+            if kind == "status":
+                status_var.set(payload)
+            elif kind == "info":
+                messagebox.showinfo("Info", payload)
+            elif kind == "error":
+                messagebox.showerror("Error", payload)
+            elif kind == "result":
+                show_result(*payload)
+            elif kind == "history":
+                render_history_page(*payload)
+            elif kind == "history_cleared":
+                view_history()
+            elif kind == "done":
+                if job in pending_jobs:
+                    pending_jobs.remove(job)
+                update_progress()
+    except queue.Empty:
+        pass
+    root.after(POLL_MS, poll_messages)
+
+def update_progress(message=None):
+    if pending_jobs:
+        progress.start(10)
+        cancel_button.configure(state="normal")
+        queued = len(pending_jobs) - 1
+        if message:
+            status_var.set(message + (f" {queued} more queued." if queued else ""))
+    else:
+        progress.stop()
+        cancel_button.configure(state="disabled")
+        if message:
+            status_var.set(message)
+
+def cancel_lookups():
+    # Queued jobs never start; a running one finishes its current request and is discarded
+    cancelled = len(pending_jobs)
+    for job in pending_jobs:
+        job.cancelled.set()
+        job.future.cancel()
+    pending_jobs.clear()
+    update_progress(f"Cancelled {cancelled} lookup{'s' if cancelled != 1 else ''}.")
+
+def show_result(result, ip_location):
+    if result.status == "parse_error":
         messagebox.showerror("Error", "Error parsing phone number. Ensure it starts with '+' and contains only digits.")
         status_var.set("")
+        return
+    if result.status == "invalid":
+        messagebox.showerror("Error", "Invalid phone number.")
+        status_var.set("")
+        return
+    if result.status == "geocode_failed":
+        messagebox.showerror("Error", f"Geocoding error: {result.error}")
+        status_var.set("")
+        return
 
-# Set up GUI
-root = ttk.Window(themename="flatly")
-root.title("Phone Number Location Tracker")
-root.geometry("500x850")
-root.resizable(True, True)
-
-# Main frame
-main_frame = ttk.Frame(root, padding=10)
-main_frame.pack(fill="both", expand=True)
-
-# Input frame
-input_frame = ttk.LabelFrame(main_frame, text="Phone Number Input", padding=10)
-input_frame.pack(fill="x", pady=5)
-ttk.Label(input_frame, text="Enter Phone Number with country code (e.g. +27):").pack(anchor="w")
-entry = ttk.Entry(input_frame, width=40)
-entry.pack(pady=5)
-entry.bind("<KeyRelease>", validate_phone_number)
-
-# Options frame
-options_frame = ttk.LabelFrame(main_frame, text="Options", padding=10)
-options_frame.pack(fill="x", pady=5)
-map_style = tk.StringVar(value="standard")
-ttk.Radiobutton(options_frame, text="Standard Map", variable=map_style, value="standard", bootstyle="primary").pack(anchor="w")
-ttk.Radiobutton(options_frame, text="Satellite View", variable=map_style, value="satellite", bootstyle="primary").pack(anchor="w")
-ttk.Radiobutton(options_frame, text="Terrain View", variable=map_style, value="terrain", bootstyle="primary").pack(anchor="w")
-# IP Address location
-ip_location_var = tk.BooleanVar(value=False)
-ttk.Checkbutton(options_frame, text="Include IP-Based Location", variable=ip_location_var, bootstyle="info").pack(anchor="w", pady=5)
-
-# Buttons frame
-buttons_frame = ttk.Frame(main_frame)
-buttons_frame.pack(fill="x", pady=10)
-ttk.Button(buttons_frame, text="Track Number", command=track_number, bootstyle="success").pack(side="left", padx=5)
-ttk.Button(buttons_frame, text="Clear Results", command=clear_results, bootstyle="warning").pack(side="left", padx=5)
-ttk.Button(buttons_frame, text="Copy Map URL", command=copy_map_url, bootstyle="info").pack(side="left", padx=5)
-
-# Results frame
-results_frame = ttk.LabelFrame(main_frame, text="Results", padding=10)
-results_frame.pack(fill="both", expand=True, pady=5)
-result_text = tk.Text(results_frame, height=12, width=50, font=("Helvetica", 10))
-result_text.pack(fill="both", expand=True)
-
-# History filter frame
-history_filter_frame = ttk.LabelFrame(main_frame, text="History Filter", padding=10)
-history_filter_frame.pack(fill="x", pady=5)
-ttk.Label(history_filter_frame, text="Filter by Number or Country:").pack(anchor="w")
-filter_entry = ttk.Entry(history_filter_frame, width=40)
-filter_entry.pack(pady=5)
-filter_entry.bind("<KeyRelease>", lambda e: view_history(filter_entry.get()))
-
-# History frame
-history_frame = ttk.LabelFrame(main_frame, text="History", padding=10)
-history_frame.pack(fill="both", expand=True, pady=5)
-history_text = scrolledtext.ScrolledText(history_frame, height=10, width=50, font=("Helvetica", 10))
-history_text.pack(fill="both", expand=True)
-
-# History buttons frame
-history_buttons_frame = ttk.Frame(main_frame)
-history_buttons_frame.pack(fill="x", pady=5)
-ttk.Button(history_buttons_frame, text="View History", command=lambda: view_history(filter_entry.get()), bootstyle="primary").pack(side="left", padx=5)
-ttk.Button(history_buttons_frame, text="View History Map", command=view_history_map, bootstyle="primary").pack(side="left", padx=5)
-ttk.Button(history_buttons_frame, text="Clear History", command=clear_history, bootstyle="danger").pack(side="left", padx=5)
-
-# Status bar
-status_var = tk.StringVar(value="Ready")
-map_url_var = tk.StringVar(value="")
-status_bar = ttk.Label(main_frame, textvariable=status_var, relief="sunken", anchor="w", padding=5)
-status_bar.pack(fill="x", side="bottom")
-
-root.mainloop()
\ No newline at end of file
+    # Update result text
+    result_text.delete(1.0, tk.END)
+    result_text.insert(tk.END, f"Phone Number: {result.number}\n", "bold")
+    result_text.insert(tk.END, f"Type: {result.number_type}\n")
+    result_text.insert(tk.END, f"Country and Location: {result.country} in {result.detailed_location if result.detailed_location else 'Not available'}\n")
+    result_text.insert(tk.END, f"Service Provider: {result.service_provider if result.service_provider else 'Unknown'}\n")
+    result_text.insert(tk.END, f"Time Zone: {result.time_zone if result.time_zone else 'Unknown'}\n")
+    result_text.insert(tk.END, f"Latitude and Longitude: {result.lat}, {result.lng}\n")
+    result_text.insert(tk.END, f"Geocoding Confidence: {result.confidence}\n")
+    if ip_location:
+        result_text.insert(tk.END, f"IP Location: {ip_location}\n")
+    result_text.insert(tk.END, f"Map URL: {result.map_url}\n", "link")
+    map_url_var.set(result.map_url)
+
+    # Configure text tags
+    result_text.tag_configure("bold", font=("Helvetica", 10, "bold"))
+    result_text.tag_configure("link", foreground="blue", underline=1)
+    result_text.tag_bind("link", "<Button-1>", lambda e: webbrowser.open(map_url_var.get()))
+
+    source = "cached coordinates" if result.source in ("cache", "index") else "geocoded"
+    status_var.set(f"{result.number}: {source}, exported to {exporter.path}")
+
+def main():
+    global engine, history, history_filter, history_map, exporter, lookup_executor, ip_executor, history_executor, root, entry, map_style, ip_location_var, show_map_var, result_text, filter_entry, history_text, history_page_var, status_var, map_url_var, progress, cancel_button
+
+    # Set up GUI
+    root = ttk.Window(themename="flatly")
+    if not get_settings().api_key:
+        messagebox.showerror("Error", "OPENCAGE_API_KEY not found in .env file")
+        root.destroy()
+        return
+    # Load the prefix data while the window is built, not on the first lookup
+    start_warm_up(get_settings().warm_regions)
+    engine = get_lookup()
+    # Open the append-only history store (imports history.json on first run)
+    history = open_history()
+    history_filter = HistoryFilter(history)
+    history_map = HistoryMapFile("history_map.html")
+    # One export file handle for the whole session; each lookup is flushed as it's written
+    exporter = open_writer(get_settings().export_file, buffer_size=1)
+    lookup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lookup")
+    ip_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ip-location")
+    history_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history")
+
+    root.title("Phone Number Location Tracker")
+    root.geometry("500x850")
+    root.resizable(True, True)
+
+    # Main frame
+    main_frame = ttk.Frame(root, padding=10)
+    main_frame.pack(fill="both", expand=True)
+
+    # Input frame
+    input_frame = ttk.LabelFrame(main_frame, text="Phone Number Input", padding=10)
+    input_frame.pack(fill="x", pady=5)
+    ttk.Label(input_frame, text="Enter Phone Number with country code (e.g. +27):").pack(anchor="w")
+    entry = ttk.Entry(input_frame, width=40)
+    entry.pack(pady=5)
+    entry.bind("<KeyRelease>", validate_phone_number)
+
+    # Options frame
+    options_frame = ttk.LabelFrame(main_frame, text="Options", padding=10)
+    options_frame.pack(fill="x", pady=5)
+    map_style = tk.StringVar(value="standard")
+    ttk.Radiobutton(options_frame, text="Standard Map", variable=map_style, value="standard", bootstyle="primary").pack(anchor="w")
+    ttk.Radiobutton(options_frame, text="Satellite View", variable=map_style, value="satellite", bootstyle="primary").pack(anchor="w")
+    ttk.Radiobutton(options_frame, text="Terrain View", variable=map_style, value="terrain", bootstyle="primary").pack(anchor="w")
+    # IP Address location
+    ip_location_var = tk.BooleanVar(value=False)
+    ttk.Checkbutton(options_frame, text="Include IP-Based Location", variable=ip_location_var, command=prefetch_ip_location, bootstyle="info").pack(anchor="w", pady=5)
+    show_map_var = tk.BooleanVar(value=True)
+    ttk.Checkbutton(options_frame, text="Open Map After Lookup", variable=show_map_var, bootstyle="info").pack(anchor="w")
+
+    # Buttons frame
+    buttons_frame = ttk.Frame(main_frame)
+    buttons_frame.pack(fill="x", pady=10)
+    ttk.Button(buttons_frame, text="Track Number", command=track_number, bootstyle="success").pack(side="left", padx=5)
+    ttk.Button(buttons_frame, text="Clear Results", command=clear_results, bootstyle="warning").pack(side="left", padx=5)
+    ttk.Button(buttons_frame, text="Copy Map URL", command=copy_map_url, bootstyle="info").pack(side="left", padx=5)
+
+    # Results frame
+    results_frame = ttk.LabelFrame(main_frame, text="Results", padding=10)
+    results_frame.pack(fill="both", expand=True, pady=5)
+    result_text = tk.Text(results_frame, height=12, width=50, font=("Helvetica", 10))
+    result_text.pack(fill="both", expand=True)
+
+    # History filter frame
+    history_filter_frame = ttk.LabelFrame(main_frame, text="History Filter", padding=10)
+    history_filter_frame.pack(fill="x", pady=5)
+    ttk.Label(history_filter_frame, text="Filter by Number or Country:").pack(anchor="w")
+    filter_entry = ttk.Entry(history_filter_frame, width=40)
+    filter_entry.pack(pady=5)
+    filter_entry.bind("<KeyRelease>", schedule_filter)
+
+    # History frame
+    history_frame = ttk.LabelFrame(main_frame, text="History", padding=10)
+    history_frame.pack(fill="both", expand=True, pady=5)
+    history_text = scrolledtext.ScrolledText(history_frame, height=10, width=50, font=("Helvetica", 10))
+    history_text.pack(fill="both", expand=True)
+    history_page_frame = ttk.Frame(history_frame)
+    history_page_frame.pack(fill="x", pady=(5, 0))
+    history_page_var = tk.StringVar(value="")
+    ttk.Button(history_page_frame, text="< Newer", command=lambda: show_history_page(history_page - 1), bootstyle="secondary-outline").pack(side="left")
+    ttk.Label(history_page_frame, textvariable=history_page_var, anchor="center").pack(side="left", fill="x", expand=True)
+    ttk.Button(history_page_frame, text="Older >", command=lambda: show_history_page(history_page + 1), bootstyle="secondary-outline").pack(side="right")
+
+    # History buttons frame
+    history_buttons_frame = ttk.Frame(main_frame)
+    history_buttons_frame.pack(fill="x", pady=5)
+    ttk.Button(history_buttons_frame, text="View History", command=lambda: view_history(filter_entry.get()), bootstyle="primary").pack(side="left", padx=5)
+    ttk.Button(history_buttons_frame, text="View History Map", command=view_history_map, bootstyle="primary").pack(side="left", padx=5)
+    ttk.Button(history_buttons_frame, text="Clear History", command=clear_history, bootstyle="danger").pack(side="left", padx=5)
+
+    # Status bar
+    status_var = tk.StringVar(value="Ready")
+    map_url_var = tk.StringVar(value="")
+    status_frame = ttk.Frame(main_frame)
+    status_frame.pack(fill="x", side="bottom")
+    cancel_button = ttk.Button(status_frame, text="Cancel", command=cancel_lookups, bootstyle="secondary", state="disabled")
+    cancel_button.pack(side="right", padx=5)
+    progress = ttk.Progressbar(status_frame, mode="indeterminate", length=80, bootstyle="info")
+    progress.pack(side="right", padx=5)
+    status_bar = ttk.Label(status_frame, textvariable=status_var, relief="sunken", anchor="w", padding=5)
+    status_bar.pack(fill="x", side="left", expand=True)
+
+    root.after(POLL_MS, poll_messages)
+    root.mainloop()
+    for job in pending_jobs:
+        job.cancelled.set()
+        job.future.cancel()
+    # The export file is written on the lookup thread, so close it there, after any running lookup
+    lookup_executor.submit(exporter.close)
+    lookup_executor.shutdown(wait=False)
+    ip_executor.shutdown(wait=False, cancel_futures=True)
+    history_executor.shutdown(wait=False, cancel_futures=True)
+    # PHONELOOKUP_METRICS=metrics.json (or .prom) records where the time went
+    if get_settings().metrics_file:
+        write_metrics(get_settings().metrics_file, engine.timer, engine.stats())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+"""Phone number lookup helpers shared by the CLI, the GUI and batch jobs.
+
+    from phonelookup import lookup
+    result = lookup("+14155552671")
+    print(result.country, result.lat, result.lng)
+
+Importing the package does no file or network I/O; configuration, the geocode cache and
+the centroid index are opened on first use.
+"""
+from .core import LookupResult, PhoneLookup, get_lookup, lookup, lookup_many
+
+__all__ = ["LookupResult", "PhoneLookup", "get_lookup", "lookup", "lookup_many"]
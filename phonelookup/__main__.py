@@ -0,0 +1,60 @@
+import argparse
+
+from . import batch, centroids, server
+from .cache import open_cache
+from .maps import MAP_MODES
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m phonelookup", description="Phone number lookup tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    batch.add_arguments(subparsers.add_parser("batch", help="look up numbers from a file or stdin"))
+    centroids.add_arguments(subparsers.add_parser("build-index", help="build the offline region centroid index"))
+    cache_parser = subparsers.add_parser("cache", help="inspect or maintain the geocode cache")
+    cache_parser.add_argument("--purge", action="store_true", help="delete expired entries")
+    cache_parser.add_argument("--import-json", metavar="FILE", help="import entries from a geocode_cache.json file")
+    server.add_arguments(subparsers.add_parser("serve", help="run the HTTP lookup service"))
+    map_parser = subparsers.add_parser("map", help="render the lookup history as an aggregated map")
+    map_parser.add_argument("-o", "--output", default="history_map.html", help="HTML file to write")
+    map_parser.add_argument("--mode", choices=MAP_MODES, default="cluster", help="how to draw locations")
+    return parser
+
+
+def cache_command(args):
+    cache = open_cache()
+    if args.import_json:
+        print(f"Imported {cache.import_json(args.import_json)} entries from {args.import_json}")
+    if args.purge:
+        print(f"Purged {cache.purge_expired()} expired entries")
+    print(f"{len(cache)} live entries in {cache.path}")
+    cache.close()
+
+
+def map_command(args):
+    from .history import open_history
+    from .maps import save_history_map
+    history = open_history()
+    drawn = save_history_map(history, args.output, args.mode)
+    if drawn:
+        print(f"Mapped {len(history)} lookups at {drawn} locations to {args.output}")
+    else:
+        print("No history available to map.")
+    history.close()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "batch":
+        batch.main(args)
+    elif args.command == "build-index":
+        centroids.main(args)
+    elif args.command == "cache":
+        cache_command(args)
+    elif args.command == "serve":
+        server.main(args)
+    elif args.command == "map":
+        map_command(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import csv
+import itertools
+import os
+import sys
+
+from .checkpoint import Checkpoint
+from .core import PhoneLookup, enlarge_regex_cache
+from .maps import MAP_STYLES, LocationMapWriter
+from .metrics import StageTimer, profiled, write_metrics
+from .writers import FORMATS, WRITERS, open_writer
+
+
+def read_numbers(source, column=None):
+    """Yield raw phone numbers one at a time from a CSV file, a text file or stdin ("-")."""
+    if source == "-":
+        yield from _read_lines(sys.stdin)
+        return
+    with open(source, newline="", encoding="utf-8") as f:
+        if source.lower().endswith(".csv"):
+            yield from _read_csv(f, column)
+        else:
+            yield from _read_lines(f)
+
+
+def _read_lines(f):
+    for line in f:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def _read_csv(f, column):
+    reader = csv.reader(f)
+    index = 0
+    if column is not None and not str(column).isdigit():
+        header = next(reader, None)
+        if header is None:
+            return
+        if column not in header:
+            raise ValueError(f"Column '{column}' not found in CSV header")
+        index = header.index(column)
+    else:
+        index = int(column or 0)
+        # Without a column name there is no telling whether the file has a header; every
+        # phone number has digits, so a first row without any in that column is one
+        first = next(reader, None)
+        if first is None:
+            return
+        if len(first) > index and any(char.isdigit() for char in first[index]):
+            reader = itertools.chain([first], reader)
+    for row in reader:
+        if len(row) > index and row[index].strip():
+            yield row[index].strip()
+
+
+def run_batch(numbers, writer, region=None, geocode=True, timer=None, window=1000,
+              geocode_workers=4, rate=None, stub_geocoder=False, workers=1, ordered=True, map_writer=None,
+              include_ip=False, prefilter=False, checkpoint=None):
+    """Stream lookups for an iterable of raw numbers into a ResultWriter.
+
+    Results are produced by PhoneLookup.lookup_many, so input and output are never held
+    in memory beyond one window of `window` numbers. Per-number maps are only rendered
+    when a LocationMapWriter is passed as `map_writer`. With `include_ip`, the machine's
+    own IP location is resolved once and written alongside every result.
+
+    With a Checkpoint, progress is saved at window boundaries every `checkpoint.every`
+    numbers (results must be ordered) and geocoded coordinates reach the cache at those
+    saves rather than after every round; the checkpoint is removed once the run completes.
+    """
+    if checkpoint is not None and not ordered:
+        raise ValueError("Checkpoints need results in input order")
+    timer = timer or StageTimer()
+    engine = PhoneLookup(geocode=geocode, stub_geocoder=stub_geocoder, geocode_workers=geocode_workers,
+                         rate=rate, timer=timer)
+    processed = 0
+    failed = 0
+    ip_location = None
+    try:
+        if include_ip:
+            with timer.stage("ip_location"):
+                ip_location = engine.ip_locator.get()[0]
+        resolver = engine.resolver if geocode and checkpoint is not None else None
+        if resolver is not None:
+            resolver.hold_writes()
+        for result in engine.lookup_many(numbers, region, window, workers, ordered, prefilter):
+            processed += 1
+            if result.status != "ok":
+                timer.count(result.status)
+                if result.status == "geocode_failed":
+                    failed += 1
+            with timer.stage("write"):
+                writer.write(result, ip_location)
+            if map_writer is not None:
+                with timer.stage("map"):
+                    map_writer.write(result)
+            if checkpoint is not None and processed % window == 0 and checkpoint.due(processed):
+                with timer.stage("checkpoint"):
+                    checkpoint.save(processed, writer, resolver)
+        if checkpoint is not None:
+            checkpoint.clear()
+    finally:
+        with timer.stage("write"):
+            writer.close()
+        if map_writer is not None:
+            with timer.stage("map"):
+                map_writer.close()
+        engine.close()
+    if prefilter:
+        print(f"Prefilter: {timer.counters.get('prefiltered', 0)} numbers rejected or repeated, never parsed",
+              file=sys.stderr)
+    elif workers <= 1:
+        memo = engine.memo
+        print(f"Metadata memo: {memo.numbers.hits} repeated numbers, {memo.prefixes.hits} shared prefixes",
+              file=sys.stderr)
+    if geocode:
+        resolver = engine.resolver
+        print(f"Geocoding: {resolver.hits} cache hits, {resolver.requests} distinct queries sent, "
+              f"{failed} numbers without coordinates", file=sys.stderr)
+    return processed, timer, engine.stats()
+
+
+def add_arguments(parser):
+    parser.add_argument("source", help="CSV or text file with one number per line, or '-' for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output file (default: CSV on stdout)")
+    parser.add_argument("--format", choices=sorted(WRITERS),
+                        help="output format (default: from the file extension, else csv)")
+    parser.add_argument("--column", help="CSV column name or index holding the numbers (default: first column); "
+                             "without a name, a first row with no digits in that column is taken as a header")
+    parser.add_argument("--region", help="default region for numbers without a country code, e.g. ZA")
+    parser.add_argument("--no-geocode", action="store_true", help="skip coordinate lookup")
+    parser.add_argument("--window", type=int, default=1000, help="numbers enriched per geocoding round (default: 1000)")
+    parser.add_argument("--geocode-workers", type=int, default=4, help="concurrent geocoding requests (default: 4)")
+    parser.add_argument("--rate", type=float, help="maximum geocoding requests per second")
+    parser.add_argument("--stub-geocoder", action="store_true", help="use a local fake geocoder instead of OpenCage")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes for parsing and metadata lookups (default: 1, 0 for one per CPU)")
+    parser.add_argument("--unordered", action="store_true", help="write rows as soon as they are ready instead of in input order")
+    parser.add_argument("--prefilter", action="store_true",
+                        help="clean up, reject and deduplicate input with pandas before parsing")
+    parser.add_argument("--include-ip", action="store_true", help="fill the IP location column with this machine's location")
+    parser.add_argument("--maps", metavar="DIR", help="also write one HTML map per number into DIR")
+    parser.add_argument("--map-style", choices=sorted(MAP_STYLES), default="standard", help="tiles for --maps")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="save progress next to the output (OUTPUT.checkpoint) so the run can be resumed")
+    parser.add_argument("--checkpoint-every", type=int, default=10000, metavar="N",
+                        help="numbers between checkpoints (default: 10000)")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue from OUTPUT.checkpoint if there is one (implies --checkpoint)")
+    parser.add_argument("--metrics", metavar="FILE", help="write stage timings and hit ratios as JSON (or Prometheus text for .prom)")
+    parser.add_argument("--profile", metavar="FILE", help="run under cProfile and save the stats to FILE")
+
+
+def main(args):
+    enlarge_regex_cache()
+    numbers = read_numbers(args.source, args.column)
+    options = dict(region=args.region, geocode=not args.no_geocode, window=args.window,
+                   geocode_workers=args.geocode_workers, rate=args.rate, stub_geocoder=args.stub_geocoder,
+                   workers=args.workers or os.cpu_count() or 1, ordered=not args.unordered,
+                   include_ip=args.include_ip, prefilter=args.prefilter)
+    checkpoint = None
+    resumed = False
+    if args.checkpoint or args.resume:
+        format = args.format or FORMATS.get(os.path.splitext(args.output)[1].lower(), "csv")
+        checkpoint = Checkpoint(args.source, args.output, format, args.region, args.checkpoint_every)
+        if args.resume and checkpoint.load():
+            numbers = checkpoint.resume(numbers)
+            resumed = True
+            print(f"Resuming after {checkpoint.skip} numbers", file=sys.stderr)
+    writer = open_writer(args.output, args.format, append=resumed)
+    map_writer = LocationMapWriter(args.maps, args.map_style) if args.maps else None
+    with profiled(args.profile):
+        processed, timer, stats = run_batch(numbers, writer, map_writer=map_writer, checkpoint=checkpoint,
+                                            **options)
+    print(timer.report(processed), file=sys.stderr)
+    if args.metrics:
+        write_metrics(args.metrics, timer, stats)
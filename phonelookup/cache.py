@@ -0,0 +1,183 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DAY = 24 * 60 * 60
+
+
+class GeocodeCache:
+    """SQLite-backed geocode cache with an in-memory LRU front tier.
+
+    Behaves like the dict the JSON cache used to be (`get`, `in`, item assignment), but
+    each insert is a single-row transaction instead of a rewrite of the whole file. WAL
+    mode lets several processes read and write the same file safely.
+
+    Entries expire after `ttl` seconds, or after `low_confidence_ttl` when OpenCage's
+    confidence is below `min_confidence` (country-sized results are worth re-checking
+    sooner than precise ones).
+    """
+
+    def __init__(self, path, max_memory_entries=10000, ttl=90 * DAY, low_confidence_ttl=7 * DAY,
+                 min_confidence=3, legacy_json=None):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.ttl = ttl
+        self.low_confidence_ttl = low_confidence_ttl
+        self.min_confidence = min_confidence
+        self.memory = OrderedDict()
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._pid = None
+        if legacy_json:
+            self.import_json(legacy_json)
+
+    @property
+    def conn(self):
+        # Connections must not be shared across a fork, so reopen in child processes
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocode ("
+                "query TEXT PRIMARY KEY, lat REAL NOT NULL, lng REAL NOT NULL, "
+                "confidence TEXT, created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._pid = os.getpid()
+            self.memory.clear()
+        return self._conn
+
+    def _expiry(self, confidence, now):
+        try:
+            precise = float(confidence) >= self.min_confidence
+        except (TypeError, ValueError):
+            precise = False
+        return now + (self.ttl if precise else self.low_confidence_ttl)
+
+    def _remember(self, query, entry):
+        self.memory[query] = entry
+        self.memory.move_to_end(query)
+        if len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, query, default=None):
+        now = time.time()
+        with self.lock:
+            item = self.memory.get(query)
+            if item is not None and item[1] > now:
+                self.memory.move_to_end(query)
+                self.hits += 1
+                return item[0]
+            row = self.conn.execute(
+                "SELECT lat, lng, confidence, expires_at FROM geocode WHERE query = ? AND expires_at > ?",
+                (query, now),
+            ).fetchone()
+            if row is None:
+                self.memory.pop(query, None)
+                self.misses += 1
+                return default
+            entry = {"lat": row[0], "lng": row[1], "confidence": _confidence_value(row[2])}
+            self._remember(query, (entry, row[3]))
+            self.hits += 1
+            return entry
+
+    def get_stale(self, query, default=None):
+        """Return an entry even if it has expired; for when upstream can't provide a fresh one."""
+        with self.lock:
+            row = self.conn.execute("SELECT lat, lng, confidence FROM geocode WHERE query = ?", (query,)).fetchone()
+        if row is None:
+            return default
+        return {"lat": row[0], "lng": row[1], "confidence": _confidence_value(row[2])}
+
+    def __contains__(self, query):
+        return self.get(query) is not None
+
+    def __getitem__(self, query):
+        entry = self.get(query)
+        if entry is None:
+            raise KeyError(query)
+        return entry
+
+    def __setitem__(self, query, entry):
+        self.update({query: entry})
+
+    def update(self, entries):
+        """Insert or replace several entries in one transaction."""
+        now = time.time()
+        rows = []
+        for query, entry in entries.items():
+            confidence = entry.get("confidence", "N/A")
+            rows.append((query, entry["lat"], entry["lng"], str(confidence), now, self._expiry(confidence, now)))
+        if not rows:
+            return
+        with self.lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?, ?)", rows)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            for query, lat, lng, confidence, _, expires_at in rows:
+                entry = {"lat": lat, "lng": lng, "confidence": _confidence_value(confidence)}
+                self._remember(query, (entry, expires_at))
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM geocode WHERE expires_at > ?", (time.time(),)).fetchone()[0]
+
+    def purge_expired(self):
+        with self.lock:
+            cursor = self.conn.execute("DELETE FROM geocode WHERE expires_at <= ?", (time.time(),))
+            self.memory.clear()
+            return cursor.rowcount
+
+    def import_json(self, json_file):
+        """Copy entries from the old geocode_cache.json format, keeping existing rows."""
+        try:
+            with open(json_file, "r") as f:
+                content = f.read().strip()
+                legacy = json.loads(content) if content else {}
+        except (FileNotFoundError, json.JSONDecodeError):
+            return 0
+        with self.lock:
+            known = {row[0] for row in self.conn.execute("SELECT query FROM geocode")}
+        missing = {query: entry for query, entry in legacy.items() if query not in known}
+        self.update(missing)
+        return len(missing)
+
+    def close(self):
+        with self.lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+            self.memory.clear()
+
+
+def _confidence_value(confidence):
+    try:
+        return int(confidence)
+    except (TypeError, ValueError):
+        return confidence
+
+
+def scratch_cache():
+    """An in-memory cache for runs against a fake geocoder, so its made-up coordinates never
+    reach the shared cache file that real lookups read."""
+    return GeocodeCache(":memory:")
+
+
+def open_cache(settings=None):
+    """Open the geocode cache configured in the settings, importing the legacy JSON cache once."""
+    if settings is None:
+        from .config import get_settings
+        settings = get_settings()
+    legacy = settings.legacy_cache_file if not os.path.exists(settings.cache_file) else None
+    return GeocodeCache(settings.cache_file, max_memory_entries=settings.cache_memory_entries,
+                        ttl=settings.cache_ttl, legacy_json=legacy)
@@ -0,0 +1,286 @@
+import csv
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+# File layout: header, then `count` sorted uint64 keys, `count` (lat, lng) float32 pairs
+# and `count` uint8 confidences, all little-endian.
+MAGIC = b"PLCENT1\0"
+HEADER = struct.Struct("<8sII")
+
+
+def index_key(region, description):
+    digest = hashlib.blake2b(f"{region}\x1f{description}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class CentroidIndex:
+    """Read-only, memory-mapped map of (region code, description) to a centroid.
+
+    Opening the index costs one mmap call; each lookup is a binary search over the
+    mapped key array, so nothing is parsed or loaded up front.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, _ = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a region centroid index")
+        start = HEADER.size
+        coords_start = start + 8 * self.count
+        conf_start = coords_start + 8 * self.count
+        view = memoryview(self.mm)
+        if sys.byteorder == "little":
+            self.keys = view[start:coords_start].cast("Q")
+            self.coords = view[coords_start:conf_start].cast("f")
+        else:
+            self.keys = array("Q", view[start:coords_start])
+            self.coords = array("f", view[coords_start:conf_start])
+            self.keys.byteswap()
+            self.coords.byteswap()
+        self.confidence = view[conf_start:conf_start + self.count]
+
+    def get(self, region, description):
+        if not region or not description:
+            return None
+        key = index_key(region, description)
+        i = bisect_left(self.keys, key)
+        if i == self.count or self.keys[i] != key:
+            return None
+        confidence = self.confidence[i]
+        return {
+            "lat": round(self.coords[2 * i], 6),
+            "lng": round(self.coords[2 * i + 1], 6),
+            "confidence": confidence if confidence else "N/A",
+        }
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        if isinstance(self.keys, memoryview):
+            self.keys.release()
+            self.coords.release()
+        self.confidence.release()
+        self.mm.close()
+
+
+def write_index(path, entries):
+    """Write (region, description, lat, lng, confidence) tuples to an index file atomically."""
+    records = {}
+    for region, description, lat, lng, confidence in entries:
+        records[index_key(region, description)] = (lat, lng, confidence)
+    keys = array("Q", sorted(records))
+    coords = array("f")
+    confidences = bytearray()
+    for key in keys:
+        lat, lng, confidence = records[key]
+        coords.extend((lat, lng))
+        try:
+            confidences.append(max(0, min(255, int(confidence))))
+        except (TypeError, ValueError):
+            confidences.append(0)
+    if sys.byteorder != "little":
+        keys.byteswap()
+        coords.byteswap()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(keys), 0))
+        keys.tofile(f)
+        coords.tofile(f)
+        f.write(confidences)
+    os.replace(tmp_path, path)
+    return len(keys)
+
+
+def _country_code_for_prefix(prefix):
+    import phonenumbers
+    for length in (1, 2, 3):
+        country_code = int(prefix[:length])
+        if country_code in phonenumbers.COUNTRY_CODE_TO_REGION_CODE:
+            return country_code, prefix[length:]
+    return None, None
+
+
+def _region_for_prefix(country_code, national_prefix):
+    # Calling codes shared by several regions (+1, +7, +44, ...) need a plausible full
+    # number to tell which region a prefix belongs to, so pad it out until one matches
+    import phonenumbers
+    regions = phonenumbers.COUNTRY_CODE_TO_REGION_CODE[country_code]
+    if len(regions) == 1:
+        return regions[0]
+    lengths = _national_lengths(country_code)
+    lengths += [length for length in range(4, 13) if length not in lengths]
+    for length in lengths:
+        if length < len(national_prefix):
+            continue
+        for pad in "0123456789":
+            digits = (national_prefix + pad * length)[:length]
+            numobj = phonenumbers.PhoneNumber(country_code=country_code, national_number=int(digits))
+            if digits.startswith("0"):
+                numobj.italian_leading_zero = True
+                numobj.number_of_leading_zeros = len(digits) - len(digits.lstrip("0"))
+            region = phonenumbers.region_code_for_number(numobj)
+            if region:
+                return region
+    return None
+
+
+_lengths_by_code = {}
+
+
+def _national_lengths(country_code):
+    # Most common national number lengths first, so the padding search usually hits on the first try
+    if country_code not in _lengths_by_code:
+        import phonenumbers
+        counts = {}
+        for region in phonenumbers.COUNTRY_CODE_TO_REGION_CODE[country_code]:
+            metadata = phonenumbers.PhoneMetadata.metadata_for_region(region)
+            if metadata is None:
+                continue
+            for length in metadata.general_desc.possible_length:
+                counts[length] = counts.get(length, 0) + 1
+        _lengths_by_code[country_code] = sorted(counts, key=lambda length: (-counts[length], -length))
+    return list(_lengths_by_code[country_code])
+
+
+def enumerate_descriptions(regions=None, lang="en"):
+    """Yield every distinct (region, description, country name) the geocoder can return."""
+    import phonenumbers
+    from phonenumbers import geocoder
+    from phonenumbers.geodata import GEOCODE_DATA
+
+    country_names = {}
+    for region in phonenumbers.SUPPORTED_REGIONS:
+        if regions and region not in regions:
+            continue
+        country_names[region] = geocoder.country_name_for_number(phonenumbers.example_number(region), lang)
+        # Numbers without a prefix description fall back to the country name
+        yield region, country_names[region], country_names[region]
+
+    seen = set()
+    for prefix, descriptions in GEOCODE_DATA.items():
+        description = descriptions.get(lang)
+        if not description:
+            continue
+        country_code, national_prefix = _country_code_for_prefix(prefix)
+        if country_code is None:
+            continue
+        regions_for_code = phonenumbers.COUNTRY_CODE_TO_REGION_CODE[country_code]
+        if regions and not any(region in regions for region in regions_for_code):
+            continue
+        if len(regions_for_code) == 1 and (regions_for_code[0], description) in seen:
+            continue
+        region = _region_for_prefix(country_code, national_prefix)
+        if region not in country_names or (region, description) in seen:
+            continue
+        seen.add((region, description))
+        yield region, description, country_names[region]
+
+
+def read_dataset(csv_file):
+    """Yield index entries from a CSV with region, description, lat, lng[, confidence] columns."""
+    with open(csv_file, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            yield (row["region"], row["description"], float(row["lat"]), float(row["lng"]),
+                   row.get("confidence") or "N/A")
+
+
+def write_dataset(csv_file, entries):
+    with open(csv_file, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["region", "description", "lat", "lng", "confidence"])
+        writer.writerows(entries)
+
+
+def resolve_descriptions(descriptions, resolver, cache_only=False, chunk_size=500, progress=None):
+    """Geocode enumerated descriptions through a GeocodeResolver, yielding index entries.
+
+    Results go through the shared geocode cache, so an interrupted or quota-limited
+    build picks up where it stopped when rerun.
+    """
+    from .core import build_query
+
+    chunk = []
+
+    def flush():
+        queries = [build_query(country, description) for _, description, country in chunk]
+        if cache_only:
+            resolved = {query: resolver.cache.get(query) for query in queries}
+        else:
+            resolved, _, _ = resolver.resolve_many(queries)
+        for (region, description, _), query in zip(chunk, queries):
+            coords = resolved.get(query)
+            if coords:
+                yield region, description, coords["lat"], coords["lng"], coords.get("confidence", "N/A")
+
+    done = 0
+    for item in descriptions:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield from flush()
+            done += len(chunk)
+            chunk = []
+            if progress:
+                progress(done)
+    if chunk:
+        yield from flush()
+        done += len(chunk)
+        if progress:
+            progress(done)
+
+
+def open_index(settings=None):
+    """Open the configured centroid index, or return None if it hasn't been built."""
+    if settings is None:
+        from .config import get_settings
+        settings = get_settings()
+    if not settings.centroid_index_file or not os.path.exists(settings.centroid_index_file):
+        return None
+    return CentroidIndex(settings.centroid_index_file)
+
+
+def add_arguments(parser):
+    parser.add_argument("-o", "--output", help="index file to write (default: PHONELOOKUP_CENTROID_INDEX)")
+    parser.add_argument("--from-csv", metavar="FILE", help="build from a region,description,lat,lng dataset")
+    parser.add_argument("--export-csv", metavar="FILE", help="also write the resolved entries as a CSV dataset")
+    parser.add_argument("--regions", help="comma-separated region codes to include (default: all)")
+    parser.add_argument("--cache-only", action="store_true", help="only use coordinates already in the geocode cache")
+    parser.add_argument("--geocode-workers", type=int, default=4, help="concurrent geocoding requests (default: 4)")
+    parser.add_argument("--rate", type=float, help="maximum geocoding requests per second")
+    parser.add_argument("--stub-geocoder", action="store_true",
+                        help="use a local fake geocoder instead of OpenCage (needs -o other than the default index)")
+
+
+def main(args):
+    from .config import get_settings
+    settings = get_settings()
+    output = args.output or settings.centroid_index_file
+    if args.stub_geocoder and not args.from_csv and os.path.abspath(output) == os.path.abspath(
+            settings.centroid_index_file):
+        # Lookups trust the configured index without asking OpenCage, so fake coordinates stay out of it
+        raise ValueError("--stub-geocoder builds a test index: pass -o with a path other than "
+                         f"{settings.centroid_index_file}")
+    if args.from_csv:
+        entries = list(read_dataset(args.from_csv))
+    else:
+        from .cache import open_cache, scratch_cache
+        from .geocode import GeocodeResolver, make_geocoder
+        regions = set(args.regions.upper().split(",")) if args.regions else None
+        geocoder_api = None if args.cache_only else make_geocoder(stub=args.stub_geocoder)
+        # Stub coordinates go to a scratch cache, never the shared one
+        cache = scratch_cache() if args.stub_geocoder else open_cache(settings)
+        resolver = GeocodeResolver(geocoder_api, cache, workers=args.geocode_workers, rate=args.rate)
+        progress = lambda done: print(f"Resolved {done} descriptions...", file=sys.stderr)
+        entries = list(resolve_descriptions(enumerate_descriptions(regions), resolver, args.cache_only,
+                                            progress=progress))
+    if args.export_csv:
+        write_dataset(args.export_csv, entries)
+    count = write_index(output, entries)
+    print(f"Wrote {count} region centroids to {output}")
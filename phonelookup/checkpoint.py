@@ -0,0 +1,85 @@
+"""Checkpoints that let an interrupted batch run continue where it stopped.
+
+A checkpoint is a small JSON file next to the output recording how many input numbers
+have been fully processed and how many bytes of output they produced. Every save first
+commits the coordinates geocoded since the last one to the cache (one transaction),
+then fsyncs the output, then atomically replaces the checkpoint file, so the three never
+disagree: a resumed run truncates the output to the recorded size, dropping any rows
+written after the last checkpoint, skips the numbers already done and finds every
+query they needed in the cache. Only CSV and NDJSON outputs can be resumed, as
+Parquet and Arrow files are unreadable until closed.
+"""
+import json
+import os
+import time
+from itertools import islice
+
+RESUMABLE_FORMATS = ("csv", "ndjson")
+
+
+def checkpoint_path(output):
+    return f"{output}.checkpoint"
+
+
+class Checkpoint:
+    """Progress of one batch job writing `output` from `source`, saved every `every` numbers."""
+
+    def __init__(self, source, output, format, region=None, every=10000, path=None):
+        if output == "-":
+            raise ValueError("Checkpoints need an output file, not stdout")
+        if format not in RESUMABLE_FORMATS:
+            raise ValueError(f"{format} output can't be resumed (use {' or '.join(RESUMABLE_FORMATS)})")
+        self.path = path or checkpoint_path(output)
+        self.job = {"source": source, "output": output, "format": format, "region": region}
+        self.every = every
+        # Numbers and output bytes already done when this run started
+        self.skip = 0
+        self.position = 0
+        self.saved = 0
+
+    def load(self):
+        """Read an earlier checkpoint for the same job, returning False if there is none."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return False
+        job = {key: state.get(key) for key in self.job}
+        if job != self.job:
+            raise ValueError(f"{self.path} belongs to a different job ({job}); delete it to start over")
+        output = self.job["output"]
+        size = os.path.getsize(output) if os.path.exists(output) else -1
+        if size < state["position"]:
+            raise ValueError(f"{output} is shorter than {self.path} recorded; delete the checkpoint to start over")
+        self.skip = state["offset"]
+        self.position = state["position"]
+        return True
+
+    def resume(self, numbers):
+        """Drop output written after the checkpoint and return `numbers` minus those already done."""
+        os.truncate(self.job["output"], self.position)
+        return islice(numbers, self.skip, None)
+
+    def due(self, done):
+        return done - self.saved >= self.every
+
+    def save(self, done, writer, resolver=None):
+        """Record that the first `done` numbers of this run are written and their coordinates cached."""
+        if resolver is not None:
+            resolver.flush()
+        position = writer.sync()
+        state = dict(self.job, offset=self.skip + done, position=position, saved_at=time.time())
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.saved = done
+
+    def clear(self):
+        """Remove the checkpoint once the job has finished."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
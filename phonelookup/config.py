@@ -0,0 +1,78 @@
+import os
+
+# Settings are resolved on first use so importing the package never touches .env
+_settings = None
+
+
+class Settings:
+    def __init__(self, api_key=None, cache_file="geocode_cache.db", history_file="history.db",
+                 export_file="phone_lookup_export.csv", legacy_cache_file="geocode_cache.json",
+                 cache_memory_entries=10000, cache_ttl=90 * 24 * 60 * 60, legacy_history_file="history.json",
+                 history_max_entries=None, history_max_age_days=None, centroid_index_file="region_centroids.idx",
+                 metrics_file=None, profile_file=None, ip_location_ttl=60 * 60,
+                 http_timeout=10, warm_regions=None):
+        self.api_key = api_key
+        self.cache_file = cache_file
+        self.history_file = history_file
+        self.export_file = export_file
+        self.legacy_cache_file = legacy_cache_file
+        self.cache_memory_entries = cache_memory_entries
+        self.cache_ttl = cache_ttl
+        self.legacy_history_file = legacy_history_file
+        self.history_max_entries = history_max_entries
+        self.history_max_age_days = history_max_age_days
+        self.centroid_index_file = centroid_index_file
+        # When set, the interactive front ends record stage timings / run under cProfile
+        self.metrics_file = metrics_file
+        self.profile_file = profile_file
+        self.ip_location_ttl = ip_location_ttl
+        # Seconds to wait for OpenCage or ip-api.com before giving up on a call
+        self.http_timeout = http_timeout
+        # Region codes (or "all") whose metadata is loaded up front, see core.warm_up
+        self.warm_regions = warm_regions
+
+
+def get_settings():
+    global _settings
+    if _settings is None:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _settings = Settings(
+            api_key=os.getenv("OPENCAGE_API_KEY"),
+            cache_file=os.getenv("PHONELOOKUP_CACHE_FILE", "geocode_cache.db"),
+            history_file=os.getenv("PHONELOOKUP_HISTORY_FILE", "history.db"),
+            export_file=os.getenv("PHONELOOKUP_EXPORT_FILE", "phone_lookup_export.csv"),
+            legacy_cache_file=os.getenv("PHONELOOKUP_LEGACY_CACHE_FILE", "geocode_cache.json"),
+            cache_memory_entries=int(os.getenv("PHONELOOKUP_CACHE_MEMORY_ENTRIES", "10000")),
+            cache_ttl=float(os.getenv("PHONELOOKUP_CACHE_TTL", str(90 * 24 * 60 * 60))),
+            legacy_history_file=os.getenv("PHONELOOKUP_LEGACY_HISTORY_FILE", "history.json"),
+            history_max_entries=_optional_int(os.getenv("PHONELOOKUP_HISTORY_MAX_ENTRIES")),
+            history_max_age_days=_optional_int(os.getenv("PHONELOOKUP_HISTORY_MAX_AGE_DAYS")),
+            centroid_index_file=os.getenv("PHONELOOKUP_CENTROID_INDEX", "region_centroids.idx"),
+            metrics_file=os.getenv("PHONELOOKUP_METRICS") or None,
+            profile_file=os.getenv("PHONELOOKUP_PROFILE") or None,
+            ip_location_ttl=float(os.getenv("PHONELOOKUP_IP_LOCATION_TTL", str(60 * 60))),
+            http_timeout=float(os.getenv("PHONELOOKUP_HTTP_TIMEOUT", "10")),
+            warm_regions=parse_regions(os.getenv("PHONELOOKUP_WARM_REGIONS")),
+        )
+    return _settings
+
+
+def _optional_int(value):
+    return int(value) if value else None
+
+
+def parse_regions(value):
+    """Turn "ZA,US" into ["ZA", "US"]; "all" stays "all" and an empty value is None."""
+    if not value:
+        return None
+    if value.strip().lower() == "all":
+        return "all"
+    return [region.strip().upper() for region in value.split(",") if region.strip()]
+
+
+def require_api_key():
+    key = get_settings().api_key
+    if not key:
+        raise ValueError("OPENCAGE_API_KEY not found in .env file")
+    return key
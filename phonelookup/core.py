@@ -0,0 +1,497 @@
+import re
+import threading
+from collections import OrderedDict
+
+import phonenumbers
+
+from .metrics import NullTimer
+
+NUMBER_TYPES = {0: "Unknown", 1: "Fixed line", 2: "Mobile", 3: "Fixed line or mobile"}
+
+
+RESULT_FIELDS = ("number", "status", "e164", "country", "detailed_location", "service_provider", "time_zone",
+                 "number_type", "region", "lat", "lng", "confidence", "query", "source", "error")
+
+
+class LookupResult:
+    """Everything known about one looked-up number.
+
+    `status` is "ok", "parse_error", "invalid" or "geocode_failed"; `source` says where
+    the coordinates came from ("index", "cache", "geocoder", or "fallback" when the
+    geocoder was failing and a stale or country-level cache entry stood in). Uses __slots__ so a batch
+    of results costs a fraction of the equivalent dicts.
+    """
+
+    __slots__ = RESULT_FIELDS
+
+    def __init__(self, number, status="ok", country=None, detailed_location=None, service_provider=None,
+                 time_zone=(), number_type=None, region=None, lat=None, lng=None, confidence=None,
+                 query=None, source=None, error=None, e164=None):
+        self.number = number
+        self.status = status
+        self.e164 = e164
+        self.country = country
+        self.detailed_location = detailed_location
+        self.service_provider = service_provider
+        self.time_zone = time_zone
+        self.number_type = number_type
+        self.region = region
+        self.lat = lat
+        self.lng = lng
+        self.confidence = confidence
+        self.query = query
+        self.source = source
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.status == "ok"
+
+    @property
+    def map_url(self):
+        if self.lat is None:
+            return None
+        return f"https://www.google.com/maps/place/{self.lat},{self.lng}"
+
+    def set_coords(self, coords, source):
+        self.lat = coords["lat"]
+        self.lng = coords["lng"]
+        self.confidence = coords.get("confidence", "N/A")
+        self.source = source
+
+    def set_geocode_error(self, error=None):
+        self.status = "geocode_failed"
+        self.error = str(error) if error else "Geocoding failed, no coordinates found."
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in RESULT_FIELDS}
+
+    def __repr__(self):
+        return f"LookupResult({self.number!r}, status={self.status!r}, lat={self.lat!r}, lng={self.lng!r})"
+
+
+def build_query(location, detailed_location):
+    query = detailed_location if detailed_location else location
+    if detailed_location and location:
+        query = f"{detailed_location}, {location}"
+    return query
+
+
+# phonenumbers looks its metadata patterns up through re's module-level cache on every
+# match (twice: plain and anchored). A corpus spanning many regions needs far more than
+# the default 512 slots, and once they overflow, patterns are recompiled over and over,
+# which costs more than the parsing itself
+REGEX_CACHE_SIZE = 8192
+
+
+def enlarge_regex_cache(size=REGEX_CACHE_SIZE):
+    """Let re's module-level cache hold `size` patterns, for processes that parse many regions.
+
+    This changes a process-wide (and private) setting of the re module, so the library
+    never does it on import; warm_up() and the batch and server entry points opt in.
+    """
+    if getattr(re, "_MAXCACHE", size) < size:
+        re._MAXCACHE = size
+
+_metadata_modules = None
+_prefix_digits = None
+
+
+def _metadata():
+    # phonenumbers.geocoder pulls in ~0.5s of prefix data, so defer it to the first lookup
+    global _metadata_modules, _prefix_digits
+    if _metadata_modules is None:
+        from phonenumbers import geocoder, carrier, timezone
+        from phonenumbers.carrierdata import CARRIER_LONGEST_PREFIX
+        from phonenumbers.geodata import GEOCODE_LONGEST_PREFIX
+        from phonenumbers.tzdata import TIMEZONE_LONGEST_PREFIX
+        _prefix_digits = max(GEOCODE_LONGEST_PREFIX, CARRIER_LONGEST_PREFIX, TIMEZONE_LONGEST_PREFIX)
+        _metadata_modules = (geocoder, carrier, timezone)
+    return _metadata_modules
+
+
+def prefix_digits():
+    """Return how many leading digits (country code included) the prefix data keys on.
+
+    Numbers sharing that many digits share the same geocoder, carrier and time zone
+    descriptions. Taken from the installed phonenumbers data, so it follows upgrades.
+    """
+    _metadata()
+    return _prefix_digits
+
+
+# Example numbers of these types pull in a region's metadata and the carrier, time zone
+# and geocoder prefix tables its numbers fall under
+WARM_UP_TYPES = (phonenumbers.PhoneNumberType.FIXED_LINE, phonenumbers.PhoneNumberType.MOBILE)
+
+
+def warm_up(regions=None):
+    """Load everything the first lookups would otherwise load on demand.
+
+    Always imports the geocoder, carrier and time zone data; `regions` (region codes, or
+    "all") also loads per-region metadata by describing example numbers. Call it in a
+    parent process before forking workers, so they share the data copy-on-write.
+    Returns the number of regions warmed. Also enlarges re's pattern cache, see
+    enlarge_regex_cache().
+    """
+    enlarge_regex_cache()
+    _metadata()
+    if regions == "all":
+        regions = sorted(phonenumbers.SUPPORTED_REGIONS)
+    warmed = 0
+    for region in regions or ():
+        for number_type in WARM_UP_TYPES:
+            example = phonenumbers.example_number_for_type(region, number_type)
+            if example is not None:
+                describe(phonenumbers.format_number(example, phonenumbers.PhoneNumberFormat.E164))
+        warmed += 1
+    return warmed
+
+
+def start_warm_up(regions=None):
+    """Run warm_up() on a daemon thread, so an interactive app loads metadata while the user types."""
+    thread = threading.Thread(target=warm_up, args=(regions,), name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+class LRUMemo:
+    """Small thread-safe LRU map holding at most `maxsize` entries."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_INVALID = ()
+
+
+class MetadataMemo:
+    """Memoizes number metadata by E.164 number and by (prefix, number type, region).
+
+    A repeated number skips validation and every metadata walk; a new number sharing a
+    prefix with one seen before still gets validated and typed but skips the geocoder,
+    carrier and time zone lookups. `inputs` holds whole described results by cleaned-up
+    input for describe_prefiltered(), which then skips parsing repeats as well.
+    """
+
+    def __init__(self, max_numbers=100000, max_prefixes=50000, max_inputs=100000):
+        self.numbers = LRUMemo(max_numbers)
+        self.prefixes = LRUMemo(max_prefixes)
+        self.inputs = LRUMemo(max_inputs)
+
+
+def _describe_valid(pepnumber, region_code, type_id):
+    # Tuple order matches the unpacking at the end of describe()
+    geocoder, carrier, timezone = _metadata()
+    country = geocoder.country_name_for_number(pepnumber, "en")
+    detailed_location = geocoder.description_for_number(pepnumber, "en")
+    return (
+        country,
+        detailed_location,
+        carrier.name_for_number(pepnumber, "en"),
+        timezone.time_zones_for_number(pepnumber),
+        NUMBER_TYPES.get(type_id, "Other"),
+        region_code,
+        build_query(country, detailed_location),
+    )
+
+
+def describe(number, region=None, timer=None, memo=None):
+    """Parse, validate and describe one number without resolving coordinates."""
+    timer = timer or NullTimer()
+    result = LookupResult(number)
+    try:
+        with timer.stage("parse"):
+            pepnumber = phonenumbers.parse(number, region)
+            e164 = f"+{pepnumber.country_code}{phonenumbers.national_significant_number(pepnumber)}"
+    except phonenumbers.NumberParseException as e:
+        result.status = "parse_error"
+        result.error = str(e)
+        return result
+    result.e164 = e164
+
+    fields = memo.numbers.get(e164) if memo else None
+    if fields is None:
+        with timer.stage("validate"):
+            region_code = phonenumbers.region_code_for_number(pepnumber)
+            valid = phonenumbers.is_valid_number_for_region(pepnumber, region_code)
+            type_id = phonenumbers.number_type(pepnumber) if valid else None
+        if not valid:
+            fields = _INVALID
+        else:
+            prefix_key = (e164[1:prefix_digits() + 1], type_id, region_code)
+            fields = memo.prefixes.get(prefix_key) if memo else None
+            if fields is None:
+                with timer.stage("metadata"):
+                    fields = _describe_valid(pepnumber, region_code, type_id)
+                if memo:
+                    memo.prefixes.put(prefix_key, fields)
+        if memo:
+            memo.numbers.put(e164, fields)
+
+    if fields is _INVALID:
+        result.status = "invalid"
+        return result
+    (result.country, result.detailed_location, result.service_provider, result.time_zone,
+     result.number_type, result.region, result.query) = fields
+    return result
+
+
+class PhoneLookup:
+    """Lookup engine holding the geocode cache, resolver and centroid index.
+
+    Nothing is opened until the first lookup that needs it, so constructing one (or
+    importing this module) does no file or network I/O.
+    """
+
+    def __init__(self, settings=None, geocode=True, stub_geocoder=False, geocode_workers=4, rate=None,
+                 timer=None, cache=None, index=None, geocoder_api=None, memo=None):
+        self._settings = settings
+        self.memo = memo if memo is not None else MetadataMemo()
+        self.geocode = geocode
+        self.stub_geocoder = stub_geocoder
+        self.geocode_workers = geocode_workers
+        self.rate = rate
+        self.timer = timer or NullTimer()
+        self._cache = cache
+        self._index = index
+        self._index_loaded = index is not None
+        self._geocoder_api = geocoder_api
+        self._resolver = None
+        self._ip_locator = None
+
+    @property
+    def settings(self):
+        if self._settings is None:
+            from .config import get_settings
+            self._settings = get_settings()
+        return self._settings
+
+    @property
+    def stubbed(self):
+        """True when coordinates come from a StubGeocoder rather than OpenCage."""
+        from .geocode import StubGeocoder
+        return self.stub_geocoder or isinstance(self._geocoder_api, StubGeocoder)
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            from .cache import open_cache, scratch_cache
+            # Fake coordinates must never end up in the cache that real lookups are served from
+            self._cache = scratch_cache() if self.stubbed else open_cache(self.settings)
+        return self._cache
+
+    @property
+    def index(self):
+        if not self._index_loaded:
+            from .centroids import open_index
+            self._index = open_index(self.settings)
+            self._index_loaded = True
+        return self._index
+
+    @property
+    def geocoder_api(self):
+        if self._geocoder_api is None:
+            from .geocode import make_geocoder
+            # With a centroid index the API key is optional: lookups then run fully offline
+            self._geocoder_api = make_geocoder(self.settings.api_key, stub=self.stub_geocoder,
+                                               required=self.index is None, timeout=self.settings.http_timeout)
+        return self._geocoder_api
+
+    @property
+    def resolver(self):
+        if self._resolver is None:
+            from .geocode import GeocodeResolver
+            self._resolver = GeocodeResolver(self.geocoder_api, self.cache, workers=self.geocode_workers,
+                                             rate=self.rate, timer=self.timer, fallback=True)
+        return self._resolver
+
+    @property
+    def ip_locator(self):
+        # One per engine, so every lookup in a session or batch shares the same IP location
+        if self._ip_locator is None:
+            from functools import partial
+            from .iplocation import IpLocator, fetch_ip_location
+            resolver = self.resolver if self.geocode else None
+            fetch = partial(fetch_ip_location, timeout=self.settings.http_timeout)
+            self._ip_locator = IpLocator(resolver, ttl=self.settings.ip_location_ttl, fetch=fetch)
+        return self._ip_locator
+
+    def _from_index(self, result):
+        index = self.index
+        if index is None:
+            return False
+        with self.timer.stage("index"):
+            coords = index.get(result.region, result.detailed_location)
+        if coords is None:
+            return False
+        result.set_coords(coords, "index")
+        return True
+
+    def prepare(self, number, region=None):
+        """Do everything lookup() does short of geocoding, returning (LookupResult, query).
+
+        The result has its metadata, and coordinates if the centroid index has them.
+        `query` is what is left to geocode, or None if nothing is; pass what resolving it
+        gave to finish(). Lets callers such as the HTTP service geocode elsewhere.
+        """
+        result = describe(number, region, self.timer, self.memo)
+        if not result.ok or not self.geocode or self._from_index(result):
+            return result, None
+        return result, result.query
+
+    @staticmethod
+    def finish(result, coords, source=None, error=None):
+        """Record the outcome of geocoding a prepare()d result's query and return the result."""
+        if coords:
+            result.set_coords(coords, source)
+        else:
+            result.set_geocode_error(error)
+        return result
+
+    def lookup(self, number, region=None):
+        """Look up one number, returning a LookupResult (errors are reported in its status)."""
+        result, query = self.prepare(number, region)
+        if query is None:
+            return result
+        try:
+            with self.timer.stage("geocode"):
+                coords, source = self.resolver.resolve_with_source(query)
+        except Exception as e:
+            return self.finish(result, None, error=e)
+        return self.finish(result, coords, source)
+
+    def lookup_many(self, numbers, region=None, window=1000, workers=1, ordered=True, prefilter=False):
+        """Yield a LookupResult per input number.
+
+        Numbers are processed in windows of `window`; the distinct geocoding queries of a
+        window that the centroid index can't answer are resolved together, so each region
+        is geocoded once however many numbers share it. Memory is bounded by the window.
+
+        With `workers` > 1, parsing and metadata run in a process pool while geocoding
+        stays in this process on the shared cache. Results keep input order unless
+        `ordered` is False.
+
+        With `prefilter`, input is first cleaned up and deduplicated in vectorized chunks
+        (see phonelookup.normalize, which needs pandas), so impossible numbers never reach
+        the parser and repeats are parsed once; results then always keep input order.
+        """
+        if prefilter:
+            from .normalize import describe_prefiltered
+            described = describe_prefiltered(numbers, region, self.timer, self.memo, workers)
+        elif workers > 1:
+            from .parallel import describe_parallel
+            described = describe_parallel(numbers, workers, region, ordered=ordered, timer=self.timer,
+                                          warm_regions=self.settings.warm_regions)
+        else:
+            described = (describe(number, region, self.timer, self.memo) for number in numbers)
+        for results in _windows(described, window):
+            if self.geocode:
+                self._geocode_window(results)
+            yield from results
+
+    def _geocode_window(self, results):
+        pending = [result for result in results if result.ok and not self._from_index(result)]
+        if not pending:
+            return
+        with self.timer.stage("geocode"):
+            resolved, errors, sources = self.resolver.resolve_many(result.query for result in pending)
+        for result in pending:
+            coords = resolved.get(result.query)
+            if coords:
+                result.set_coords(coords, sources.get(result.query, "cache"))
+            else:
+                result.set_geocode_error(errors.get(result.query))
+
+    def stats(self):
+        """Hit/miss counters of the memo, geocode cache and resolver, with hit ratios."""
+        stats = {
+            "memo_numbers": _hit_ratio(self.memo.numbers.hits, self.memo.numbers.misses),
+            "memo_prefixes": _hit_ratio(self.memo.prefixes.hits, self.memo.prefixes.misses),
+        }
+        if self._cache is not None:
+            stats["geocode_cache"] = _hit_ratio(self._cache.hits, self._cache.misses)
+        if self._resolver is not None:
+            stats["geocoder"] = _hit_ratio(self._resolver.hits, self._resolver.requests)
+            stats["geocoder"]["fallbacks"] = self._resolver.fallbacks
+            if hasattr(self._resolver.geocoder_api, "stats"):
+                stats["upstream"] = self._resolver.geocoder_api.stats()
+        return stats
+
+    def close(self):
+        if self._resolver is not None:
+            self._resolver.flush()
+        if self._cache is not None:
+            self._cache.close()
+        if self._index is not None:
+            self._index.close()
+
+
+def _hit_ratio(hits, misses):
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_ratio": round(hits / total, 4) if total else None}
+
+
+def _windows(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+_default_lookup = None
+
+
+def get_lookup():
+    """Return the process-wide PhoneLookup used by lookup() and lookup_many()."""
+    global _default_lookup
+    if _default_lookup is None:
+        from .config import get_settings
+        settings = get_settings()
+        # Stage timings cost a few microseconds per number, so only collect them on request
+        timer = None
+        if settings.metrics_file:
+            from .metrics import StageTimer
+            timer = StageTimer()
+        _default_lookup = PhoneLookup(settings, timer=timer)
+    return _default_lookup
+
+
+def lookup(number, region=None):
+    return get_lookup().lookup(number, region)
+
+
+def lookup_many(numbers, region=None, window=1000, workers=1, ordered=True, prefilter=False):
+    return get_lookup().lookup_many(numbers, region, window, workers, ordered, prefilter)
@@ -0,0 +1,243 @@
+import hashlib
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import NullTimer
+
+
+class RateLimiter:
+    """Spaces calls so no more than `rate` start per second across all threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class StubGeocoder:
+    """Offline stand-in for OpenCageGeocode that returns stable fake coordinates per query."""
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def geocode(self, query, **kwargs):
+        with self.lock:
+            self.calls += 1
+            fail = self.failure_rate and self.random.random() < self.failure_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise ConnectionError(f"stub failure for {query!r}")
+        digest = hashlib.blake2b(query.encode("utf-8"), digest_size=8).digest()
+        lat = int.from_bytes(digest[:4], "big") / 0xFFFFFFFF * 170 - 85
+        lng = int.from_bytes(digest[4:], "big") / 0xFFFFFFFF * 360 - 180
+        return [{"geometry": {"lat": round(lat, 6), "lng": round(lng, 6)}, "confidence": 1}]
+
+
+def _is_retriable(error):
+    from .httpclient import CircuitOpenError, PermanentError, QuotaExceededError
+    # An open circuit or an empty quota won't be fixed by retrying a moment later
+    if isinstance(error, (PermanentError, QuotaExceededError, CircuitOpenError)):
+        return False
+    try:
+        from opencage.geocoder import NotAuthorizedError, ForbiddenError, InvalidInputError, RateLimitExceededError
+    except ImportError:
+        return True
+    return not isinstance(error, (NotAuthorizedError, ForbiddenError, InvalidInputError, RateLimitExceededError))
+
+
+class GeocodeResolver:
+    """Resolves geocoding queries through a cache, issuing each distinct miss exactly once.
+
+    `geocoder_api` is anything with a `geocode(query)` method returning OpenCage-style
+    results, so a StubGeocoder can be dropped in for offline runs. With no geocoder
+    the resolver only answers from the cache. Cache reads and upstream rounds are
+    recorded in `timer` as the "cache" and "upstream" stages.
+
+    With `fallback`, a query the geocoder fails on (after retries, or straight away
+    when its circuit is open) is answered from an expired cache entry or, failing
+    that, from the cached coordinates of the country it ends with; such answers have
+    the source "fallback".
+
+    After hold_writes(), freshly geocoded coordinates are kept in memory (and still
+    answer later queries) until flush() stores them in one transaction, so a batch job
+    can commit them together with its output at each checkpoint.
+    """
+
+    def __init__(self, geocoder_api, cache, workers=4, rate=None, retries=3, backoff=0.5, timer=None,
+                 fallback=False):
+        self.geocoder_api = geocoder_api
+        self.cache = cache
+        self.workers = workers
+        self.limiter = RateLimiter(rate)
+        self.retries = retries
+        self.backoff = backoff
+        self.timer = timer or NullTimer()
+        self.fallback = fallback
+        self.requests = 0
+        self.hits = 0
+        self.fallbacks = 0
+        self.held = None
+
+    def hold_writes(self):
+        """Keep new coordinates in memory until flush() instead of writing them every round."""
+        if self.held is None:
+            self.held = {}
+
+    def flush(self):
+        """Write held coordinates to the cache in one transaction."""
+        if self.held:
+            self.cache.update(self.held)
+            self.held = {}
+
+    def _cached(self, query):
+        if self.held:
+            coords = self.held.get(query)
+            if coords is not None:
+                return coords
+        return self.cache.get(query)
+
+    def _store(self, entries):
+        if self.held is not None:
+            self.held.update(entries)
+        else:
+            self.cache.update(entries)
+
+    def _fetch(self, query):
+        if self.geocoder_api is None:
+            return None
+        attempt = 0
+        while True:
+            self.limiter.wait()
+            try:
+                results = self.geocoder_api.geocode(query)
+                break
+            except Exception as e:
+                attempt += 1
+                if attempt > self.retries or not _is_retriable(e):
+                    raise
+                # Exponential backoff with full jitter so retries from many workers spread out
+                time.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+        if not results:
+            return None
+        return {
+            "lat": results[0]["geometry"]["lat"],
+            "lng": results[0]["geometry"]["lng"],
+            "confidence": results[0].get("confidence", "N/A"),
+        }
+
+    def _fallback(self, query):
+        coords = self.cache.get_stale(query)
+        if coords is None and ", " in query:
+            country = query.rsplit(", ", 1)[1]
+            coords = self.cache.get(country) or self.cache.get_stale(country)
+        if coords is not None:
+            self.fallbacks += 1
+        return coords
+
+    def resolve(self, query):
+        """Return cached or freshly geocoded coordinates for one query, or None if not found."""
+        return self.resolve_with_source(query)[0]
+
+    def resolve_with_source(self, query):
+        """Like resolve(), but also says whether the answer came from the "cache", the "geocoder" or a "fallback"."""
+        with self.timer.stage("cache"):
+            cached = self._cached(query)
+        if cached is not None:
+            self.hits += 1
+            return cached, "cache"
+        self.requests += 1
+        try:
+            with self.timer.stage("upstream"):
+                coords = self._fetch(query)
+        except Exception:
+            coords = self._fallback(query) if self.fallback else None
+            if coords is None:
+                raise
+            return coords, "fallback"
+        if coords:
+            self._store({query: coords})
+        return coords, "geocoder"
+
+    def resolve_many(self, queries):
+        """Resolve an iterable of queries.
+
+        Returns ({query: coords or None}, {query: error}, {query: source}), the last
+        holding "geocoder" or "fallback" for every query not answered by the cache.
+        """
+        resolved = {}
+        misses = []
+        seen = set()
+        start = time.perf_counter()
+        for query in queries:
+            if query in seen:
+                continue
+            seen.add(query)
+            cached = self._cached(query)
+            if cached is not None:
+                self.hits += 1
+                resolved[query] = cached
+            else:
+                misses.append(query)
+        self.timer.add("cache", time.perf_counter() - start, len(seen))
+        errors = {}
+        if not misses:
+            return resolved, errors, {}
+        self.requests += len(misses)
+        fetched = {}
+        sources = dict.fromkeys(misses, "geocoder")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(misses))) as pool:
+            futures = {query: pool.submit(self._fetch, query) for query in misses}
+            for query, future in futures.items():
+                try:
+                    coords = future.result()
+                except Exception as e:
+                    coords = self._fallback(query) if self.fallback else None
+                    if coords is None:
+                        errors[query] = e
+                    else:
+                        sources[query] = "fallback"
+                    resolved[query] = coords
+                    continue
+                resolved[query] = coords
+                if coords:
+                    fetched[query] = coords
+        self.timer.add("upstream", time.perf_counter() - start, len(misses))
+        # Store the whole round at once so the cache writes one transaction, not one per query
+        self._store(fetched)
+        return resolved, errors, sources
+
+
+def make_geocoder(api_key=None, stub=False, required=True, timeout=10):
+    """Return an OpenCage client, a StubGeocoder, or None when no key is set and `required` is False.
+
+    The OpenCage client shares one pooled keep-alive session per process and gives up
+    on a call after `timeout` seconds.
+    """
+    if stub:
+        return StubGeocoder()
+    if not api_key:
+        from .config import get_settings, require_api_key
+        api_key = require_api_key() if required else get_settings().api_key
+        if not api_key:
+            return None
+    from .httpclient import OpenCageClient
+    return OpenCageClient(api_key, timeout=(3.05, timeout))
+
@@ -0,0 +1,426 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+COLUMNS = ["number", "country", "detailed_location", "service_provider", "time_zone",
+           "latitude", "longitude", "number_type", "ip_location", "timestamp"]
+
+# Aggregates kept up to date on every append: dimension -> SQL expression grouped on
+STAT_DIMENSIONS = {
+    "country": "country",
+    "service_provider": "service_provider",
+    "number_type": "number_type",
+    "time_zone": "time_zone",
+    "day": "substr(timestamp, 1, 10)",
+}
+
+
+class HistoryStore:
+    """Append-only lookup history in SQLite, indexed on number, country and timestamp.
+
+    Entries are the same dicts history.json used to hold. Recording a lookup is a single
+    INSERT rather than a rewrite of the whole file, and reads stream from a cursor so the
+    history never has to fit in memory. `max_entries` and `max_age_days` bound how much
+    history is retained; pruning runs every `prune_every` appends.
+
+    Counts per STAT_DIMENSIONS value and per coordinate are materialized in side tables
+    and adjusted in the same transaction as every append, prune or clear, so counts()
+    and places() cost the same however long the history is.
+    """
+
+    def __init__(self, path, max_entries=None, max_age_days=None, prune_every=1000, legacy_json=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.prune_every = prune_every
+        self.appended = 0
+        self.lock = threading.RLock()
+        self._conn = None
+        self._pid = None
+        self._fts = False
+        if legacy_json:
+            self.import_json(legacy_json)
+
+    @property
+    def conn(self):
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, number TEXT NOT NULL, country TEXT, "
+                "detailed_location TEXT, service_provider TEXT, time_zone TEXT, latitude REAL, "
+                "longitude REAL, number_type TEXT, ip_location TEXT, timestamp TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS history_number ON history (number)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS history_country ON history (country)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS history_timestamp ON history (timestamp)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS history_stats (dimension TEXT NOT NULL, value TEXT NOT NULL, "
+                "count INTEGER NOT NULL, PRIMARY KEY (dimension, value)) WITHOUT ROWID"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS history_places (latitude REAL NOT NULL, longitude REAL NOT NULL, "
+                "count INTEGER NOT NULL, country TEXT, location TEXT, PRIMARY KEY (latitude, longitude)) WITHOUT ROWID"
+            )
+            self._pid = os.getpid()
+            self._build_stats()
+            self._fts = self._create_number_index()
+        return self._conn
+
+    def _create_number_index(self):
+        # A trigram full-text index over the numbers, kept in step by triggers, answers
+        # "contains" filters without scanning; SQLite builds without FTS5 fall back to a scan
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'history_numbers'").fetchone() is None:
+                conn.execute("CREATE VIRTUAL TABLE history_numbers USING fts5("
+                             "number, content='history', content_rowid='id', tokenize='trigram')")
+                conn.execute("INSERT INTO history_numbers (history_numbers) VALUES ('rebuild')")
+            conn.execute("CREATE TRIGGER IF NOT EXISTS history_numbers_insert AFTER INSERT ON history BEGIN "
+                         "INSERT INTO history_numbers (rowid, number) VALUES (new.id, new.number); END")
+            conn.execute("CREATE TRIGGER IF NOT EXISTS history_numbers_delete AFTER DELETE ON history BEGIN "
+                         "INSERT INTO history_numbers (history_numbers, rowid, number) "
+                         "VALUES ('delete', old.id, old.number); END")
+            conn.execute("COMMIT")
+        except sqlite3.OperationalError:
+            conn.execute("ROLLBACK")
+            return False
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return True
+
+    def record(self, number, location, detailed_location, service_provider, time_zone, lat, lng,
+               number_type_str="Unknown", ip_location=None):
+        entry = {
+            "number": number,
+            "country": location,
+            "detailed_location": detailed_location if detailed_location else "Not available",
+            "service_provider": service_provider if service_provider else "Unknown",
+            "time_zone": str(time_zone) if time_zone else "Unknown",
+            "latitude": lat,
+            "longitude": lng,
+            "number_type": number_type_str,
+            "ip_location": ip_location if ip_location else "Not retrieved",
+            "timestamp": datetime.now().isoformat()
+        }
+        self.append_many([entry])
+        return entry
+
+    def append_many(self, entries):
+        rows = [tuple(entry.get(column) for column in COLUMNS) for entry in entries]
+        if not rows:
+            return
+        with self.lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    f"INSERT INTO history ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", rows
+                )
+                self._add_entry_stats(entries)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            before = self.appended
+            self.appended += len(rows)
+            if self.appended // self.prune_every != before // self.prune_every:
+                self.prune()
+
+    def prune(self):
+        """Apply the retention limits, returning the number of entries removed."""
+        removed = 0
+        with self.lock:
+            if self.max_age_days is not None:
+                cutoff = (datetime.now() - timedelta(days=self.max_age_days)).isoformat()
+                removed += self._delete("WHERE timestamp < ?", (cutoff,))
+            if self.max_entries is not None:
+                removed += self._delete(
+                    "WHERE id <= (SELECT id FROM history ORDER BY id DESC LIMIT 1 OFFSET ?)", (self.max_entries,)
+                )
+        return removed
+
+    def _delete(self, where, params):
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._add_stats(where, params, -1)
+            removed = conn.execute(f"DELETE FROM history {where}", params).rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return removed
+
+    def _add_stats(self, where, params, sign=1):
+        # Fold the entries matching `where` into the aggregates (or out of them, with
+        # sign -1); runs inside the caller's transaction
+        conn = self.conn
+        for dimension, expression in STAT_DIMENSIONS.items():
+            conn.execute(
+                f"INSERT INTO history_stats (dimension, value, count) "
+                f"SELECT ?, COALESCE({expression}, 'Unknown'), ? * COUNT(*) FROM history {where or 'WHERE 1'} "
+                f"GROUP BY 2 ON CONFLICT (dimension, value) DO UPDATE SET count = count + excluded.count",
+                (dimension, sign, *params),
+            )
+        where = f"{where or 'WHERE 1'} AND latitude IS NOT NULL AND longitude IS NOT NULL"
+        conn.execute(
+            f"INSERT INTO history_places (latitude, longitude, count, country, location) "
+            f"SELECT latitude, longitude, ? * COUNT(*), MAX(country), MAX(detailed_location) FROM history {where} "
+            f"GROUP BY latitude, longitude ON CONFLICT (latitude, longitude) DO UPDATE SET "
+            f"count = count + excluded.count, country = COALESCE(country, excluded.country), "
+            f"location = COALESCE(location, excluded.location)",
+            (sign, *params),
+        )
+        if sign < 0:
+            conn.execute("DELETE FROM history_stats WHERE count <= 0")
+            conn.execute("DELETE FROM history_places WHERE count <= 0")
+
+    def _add_entry_stats(self, entries):
+        # The append path: the new entries are already in hand, so count them here rather
+        # than grouping them again in SQL. Must agree with the expressions in _add_stats.
+        stats = Counter()
+        places = {}
+        for entry in entries:
+            for dimension in STAT_DIMENSIONS:
+                value = (entry.get("timestamp") or "")[:10] if dimension == "day" else entry.get(dimension)
+                stats[dimension, "Unknown" if value is None else str(value)] += 1
+            lat, lng = entry.get("latitude"), entry.get("longitude")
+            if lat is not None and lng is not None:
+                place = places.setdefault((lat, lng), [0, entry.get("country"), entry.get("detailed_location")])
+                place[0] += 1
+        self.conn.executemany(
+            "INSERT INTO history_stats (dimension, value, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (dimension, value) DO UPDATE SET count = count + excluded.count",
+            [(dimension, value, count) for (dimension, value), count in stats.items()],
+        )
+        self.conn.executemany(
+            "INSERT INTO history_places (latitude, longitude, count, country, location) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (latitude, longitude) DO UPDATE SET count = count + excluded.count, "
+            "country = COALESCE(country, excluded.country), location = COALESCE(location, excluded.location)",
+            [(lat, lng, *place) for (lat, lng), place in places.items()],
+        )
+
+    def _build_stats(self):
+        # Histories written before the aggregates existed are folded in once, on first open
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if (conn.execute("SELECT 1 FROM history_stats LIMIT 1").fetchone() is None
+                    and conn.execute("SELECT 1 FROM history LIMIT 1").fetchone() is not None):
+                self._add_stats("", ())
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def counts(self, dimension, limit=None):
+        """Return [(value, count)] for one of STAT_DIMENSIONS, largest first ("day" in date order)."""
+        if dimension not in STAT_DIMENSIONS:
+            raise ValueError(f"Unknown dimension '{dimension}' (choose from {', '.join(STAT_DIMENSIONS)})")
+        order = "value" if dimension == "day" else "count DESC, value"
+        sql = f"SELECT value, count FROM history_stats WHERE dimension = ? ORDER BY {order}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self.lock:
+            return self.conn.execute(sql, (dimension,)).fetchall()
+
+    def places(self):
+        """Stream (lat, lng, count, country, location, []) per distinct coordinate from the aggregates.
+
+        The same rows as locations() without the sample numbers, read from the
+        materialized table instead of grouping the whole history.
+        """
+        with self.lock:
+            cursor = self.conn.execute("SELECT latitude, longitude, count, country, location FROM history_places")
+        for lat, lng, count, country, location in cursor:
+            yield lat, lng, count, country, location, []
+
+    def watermark(self):
+        """(highest id, entry count): changes whenever entries are appended, pruned or cleared."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT (SELECT MAX(id) FROM history), "
+                "(SELECT COALESCE(SUM(count), 0) FROM history_stats WHERE dimension = 'country')"
+            ).fetchone()
+
+    def _select(self, where="", params=(), limit=None, newest_first=False):
+        sql = f"SELECT {', '.join(COLUMNS)} FROM history {where} ORDER BY id {'DESC' if newest_first else 'ASC'}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self.lock:
+            cursor = self.conn.execute(sql, params)
+        for row in cursor:
+            yield dict(zip(COLUMNS, row))
+
+    def __iter__(self):
+        return self._select()
+
+    def _filter_clause(self, filter_text):
+        # Every branch is an index lookup and the branches are combined with UNION, so
+        # the history itself is never scanned: countries are picked from the aggregates'
+        # short list of distinct values and found through the country index, a leading
+        # '+' is a range over the number index, and any other fragment of three or more
+        # characters goes to the trigram index. Only one- or two-character fragments,
+        # which match most of the history anyway, are left to a scan.
+        needle = filter_text.lower()
+        with self.lock:
+            countries = [row[0] for row in self.conn.execute(
+                "SELECT value FROM history_stats WHERE dimension = 'country'") if needle in row[0].lower()]
+        branches = []
+        params = []
+        if countries:
+            branches.append(f"SELECT id FROM history WHERE country IN ({', '.join('?' * len(countries))})")
+            params.extend(countries)
+        if filter_text.startswith("+"):
+            branches.append("SELECT id FROM history WHERE number >= ? AND number < ?")
+            params.extend([filter_text, filter_text + "\uffff"])
+        elif self._fts and len(filter_text) >= 3:
+            branches.append("SELECT rowid FROM history_numbers WHERE history_numbers MATCH ?")
+            params.append('"' + filter_text.replace('"', '""') + '"')
+        else:
+            branches.append("SELECT id FROM history WHERE instr(lower(number), ?) > 0")
+            params.append(needle)
+        return f"WHERE id IN ({' UNION '.join(branches)})", params
+
+    def search(self, filter_text="", limit=None, newest_first=False):
+        """Stream entries whose number or country contains `filter_text` (case-insensitive)."""
+        if not filter_text:
+            return self._select(limit=limit, newest_first=newest_first)
+        where, params = self._filter_clause(filter_text)
+        return self._select(where, params, limit, newest_first)
+
+    def match_keys(self, filter_text=""):
+        """Return (id, number, country) for every entry matching `filter_text`, newest first."""
+        where, params = self._filter_clause(filter_text) if filter_text else ("", [])
+        with self.lock:
+            return self.conn.execute(
+                f"SELECT id, number, country FROM history {where} ORDER BY id DESC", params
+            ).fetchall()
+
+    def entries(self, ids):
+        """Fetch full entries for `ids`, in the order given."""
+        if not ids:
+            return []
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT id, {', '.join(COLUMNS)} FROM history WHERE id IN ({', '.join('?' * len(ids))})", list(ids)
+            ).fetchall()
+        by_id = {row[0]: dict(zip(COLUMNS, row[1:])) for row in rows}
+        return [by_id[i] for i in ids if i in by_id]
+
+    def locations(self, sample=5):
+        """Stream one row per distinct coordinate: (lat, lng, count, country, location, numbers).
+
+        Grouping happens in SQLite, so entries sharing a centroid collapse to one row and
+        `numbers` holds at most `sample` of the most recent numbers seen there.
+        """
+        sql = (
+            "SELECT latitude, longitude, COUNT(*), MAX(country), MAX(detailed_location), "
+            "group_concat(CASE WHEN rank <= ? THEN number END, char(31)) "
+            "FROM (SELECT latitude, longitude, country, detailed_location, number, "
+            "ROW_NUMBER() OVER (PARTITION BY latitude, longitude ORDER BY id DESC) AS rank "
+            "FROM history WHERE latitude IS NOT NULL AND longitude IS NOT NULL) "
+            "GROUP BY latitude, longitude"
+        )
+        with self.lock:
+            cursor = self.conn.execute(sql, (sample,))
+        for lat, lng, count, country, location, numbers in cursor:
+            yield lat, lng, count, country, location, numbers.split("\x1f") if numbers else []
+
+    def first(self):
+        return next(self._select(limit=1), None)
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def __bool__(self):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM history LIMIT 1").fetchone() is not None
+
+    def clear(self):
+        with self.lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM history")
+                conn.execute("DELETE FROM history_stats")
+                conn.execute("DELETE FROM history_places")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def import_json(self, json_file):
+        """Import a legacy history.json list, then rename it so it is only imported once."""
+        try:
+            with open(json_file, "r") as f:
+                content = f.read().strip()
+                legacy = json.loads(content) if content else []
+        except (FileNotFoundError, json.JSONDecodeError):
+            return 0
+        self.append_many(legacy)
+        os.replace(json_file, json_file + ".imported")
+        return len(legacy)
+
+    def close(self):
+        with self.lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+
+class HistoryFilter:
+    """Incremental number/country filter over a HistoryStore, for interactive search boxes.
+
+    Only the ids, numbers and countries of matching entries are held. When a query
+    contains the previous one (the usual case while typing) the previous matches are
+    narrowed in memory instead of querying the store again; full entries are fetched a
+    page at a time with page().
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.query = None
+        self.matches = []
+
+    def update(self, filter_text):
+        needle = filter_text.lower()
+        if needle == self.query:
+            return self.matches
+        if self.query is not None and self.query in needle:
+            self.matches = [match for match in self.matches
+                            if needle in match[1].lower() or (match[2] and needle in match[2].lower())]
+        else:
+            self.matches = self.store.match_keys(filter_text)
+        self.query = needle
+        return self.matches
+
+    def invalidate(self):
+        # Call after appending or clearing so the next update() reads the store again
+        self.query = None
+        self.matches = []
+
+    def page(self, page, page_size=50):
+        start = page * page_size
+        return self.store.entries([match[0] for match in self.matches[start:start + page_size]])
+
+    def __len__(self):
+        return len(self.matches)
+
+
+def open_history(settings=None):
+    """Open the history store configured in the settings, importing history.json once."""
+    if settings is None:
+        from .config import get_settings
+        settings = get_settings()
+    return HistoryStore(settings.history_file, max_entries=settings.history_max_entries,
+                        max_age_days=settings.history_max_age_days, legacy_json=settings.legacy_history_file)
@@ -0,0 +1,168 @@
+import threading
+import time
+
+OPENCAGE_URL = "https://api.opencagedata.com/geocode/v1/json"
+USER_AGENT = "phonelookup"
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class UpstreamError(Exception):
+    """A geocoding or IP lookup service could not answer."""
+
+
+class PermanentError(UpstreamError):
+    """The request itself was refused (bad key, blocked account, bad input); retrying won't help."""
+
+
+class QuotaExceededError(UpstreamError):
+    """The API quota is used up; `reset_at` is when it refills (time.time() based), if known."""
+
+    def __init__(self, message, reset_at=None):
+        super().__init__(message)
+        self.reset_at = reset_at
+
+
+class CircuitOpenError(UpstreamError):
+    """The upstream has failed repeatedly, so calls are refused until it has had time to recover."""
+
+
+def make_session(pool_size=10):
+    """Return a requests.Session that keeps up to `pool_size` connections per host alive."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+def get_session():
+    """Return the process-wide pooled session shared by every upstream client."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = make_session()
+        return _session
+
+
+class CircuitBreaker:
+    """Stops calling an upstream after `threshold` consecutive failures.
+
+    While open, before_call() raises CircuitOpenError without touching the network.
+    After `reset_after` seconds one trial call is let through (half-open): success
+    closes the circuit, failure opens it for another `reset_after`.
+    """
+
+    def __init__(self, threshold=5, reset_after=30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.rejected = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_after else "open"
+
+    def before_call(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if not self.trial and time.monotonic() - self.opened_at >= self.reset_after:
+                self.trial = True
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f"upstream failing, retrying after {self.reset_after:g}s")
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.trial = False
+
+
+class OpenCageClient:
+    """OpenCage forward geocoding over a pooled keep-alive session.
+
+    A drop-in for OpenCageGeocode.geocode() that bounds every call by `timeout`
+    ((connect, read) seconds), trips `breaker` on network errors and 5xx responses, and
+    tracks the quota OpenCage reports in its X-RateLimit-* headers: once `remaining` hits
+    zero, calls fail fast with QuotaExceededError until the quota resets.
+    """
+
+    def __init__(self, api_key, session=None, timeout=(3.05, 10), breaker=None, url=OPENCAGE_URL):
+        self.api_key = api_key
+        self.session = session or get_session()
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.url = url
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+
+    def geocode(self, query, **params):
+        import requests
+        self._check_quota()
+        self.breaker.before_call()
+        params = {"q": query, "key": self.api_key, "limit": 1, "no_annotations": 1, **params}
+        try:
+            response = self.session.get(self.url, params=params, timeout=self.timeout)
+        except requests.RequestException as e:
+            self.breaker.record_failure()
+            raise UpstreamError(f"OpenCage request failed: {e}") from e
+        self._read_quota(response.headers)
+        status = response.status_code
+        if status >= 500:
+            self.breaker.record_failure()
+            raise UpstreamError(f"OpenCage returned HTTP {status}")
+        # Anything below 500 means the service is up, whatever it thought of the request
+        self.breaker.record_success()
+        if status in (402, 429):
+            retry_after = response.headers.get("Retry-After")
+            # Without a Retry-After or reset header, wait a minute before trying again
+            delay = int(retry_after) if retry_after and retry_after.isdigit() else 60
+            if self.reset_at is None or self.reset_at <= time.time():
+                self.reset_at = time.time() + delay
+            self.remaining = 0
+            raise QuotaExceededError(f"OpenCage quota exceeded (HTTP {status})", self.reset_at)
+        if status in (400, 401, 403):
+            raise PermanentError(f"OpenCage refused the request (HTTP {status})")
+        try:
+            data = response.json()
+            return data["results"]
+        except (ValueError, KeyError) as e:
+            raise UpstreamError("unexpected response from OpenCage") from e
+
+    def _check_quota(self):
+        if self.remaining is None or self.remaining > 0:
+            return
+        if self.reset_at is not None and time.time() >= self.reset_at:
+            self.remaining = None
+            return
+        raise QuotaExceededError("OpenCage quota used up", self.reset_at)
+
+    def _read_quota(self, headers):
+        for name, attr in (("X-RateLimit-Limit", "limit"), ("X-RateLimit-Remaining", "remaining"),
+                           ("X-RateLimit-Reset", "reset_at")):
+            value = headers.get(name)
+            if value is not None and value.isdigit():
+                setattr(self, attr, int(value))
+
+    def stats(self):
+        return {"circuit_open": int(self.breaker.state != "closed"), "circuit_rejected": self.breaker.rejected,
+                "quota_limit": self.limit, "quota_remaining": self.remaining}
@@ -0,0 +1,96 @@
+import threading
+import time
+
+IP_API_URL = "http://ip-api.com/json/"
+UNKNOWN = "Unknown (error fetching IP location)"
+
+
+def fetch_ip_location(timeout=10):
+    """Ask ip-api.com where this machine's public IP is.
+
+    Returns ("City, Region, Country", coords); raises if the service can't say.
+    """
+    from .httpclient import get_session
+    response = get_session().get(IP_API_URL, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    if data.get("status") != "success":
+        raise ValueError(f"ip-api.com lookup failed: {data.get('message', 'no reason given')}")
+    label = f"{data.get('city', 'Unknown')}, {data.get('regionName', 'Unknown')}, {data.get('country', 'Unknown')}"
+    coords = None
+    if data.get("lat") is not None and data.get("lon") is not None:
+        coords = {"lat": data["lat"], "lng": data["lon"], "confidence": "N/A"}
+    return label, coords
+
+
+class IpLocator:
+    """The operator's own IP location and its coordinates, fetched once and kept for `ttl` seconds.
+
+    The first get() blocks on ip-api.com; after that get() answers from memory and, once
+    the value is older than `ttl`, returns it anyway while one background thread
+    refreshes it. The location string is geocoded through `resolver`, so its
+    coordinates live in the geocode cache with everything else; ip-api's own estimate
+    is only used when the resolver has nothing. Failures are retried after
+    `retry_after` seconds rather than on every call.
+    """
+
+    def __init__(self, resolver=None, ttl=60 * 60, retry_after=60, fetch=fetch_ip_location):
+        self.resolver = resolver
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self.fetch = fetch
+        # `lock` guards the fields; `fetch_lock` makes concurrent callers share one fetch
+        self.lock = threading.Lock()
+        self.fetch_lock = threading.Lock()
+        self.label = None
+        self.coords = None
+        self.error = None
+        self.expires_at = 0.0
+        self.fetches = 0
+        self.refreshing = False
+
+    def get(self):
+        """Return (location, coords or None), only waiting if nothing has been fetched yet."""
+        with self.lock:
+            if self.label is not None:
+                if time.monotonic() >= self.expires_at and not self.refreshing:
+                    self.refreshing = True
+                    threading.Thread(target=self.refresh, name="ip-location", daemon=True).start()
+                return self.label, self.coords
+        with self.fetch_lock:
+            if self.label is None:
+                self._refresh()
+        return self.label, self.coords
+
+    def refresh(self):
+        """Fetch again now, whether or not the current value has expired."""
+        with self.fetch_lock:
+            try:
+                self._refresh()
+            finally:
+                self.refreshing = False
+        return self.label, self.coords
+
+    def _refresh(self):
+        self.fetches += 1
+        try:
+            label, fallback = self.fetch()
+        except Exception as e:
+            with self.lock:
+                self.error = e
+                # Keep serving the last good value; only report unknown if there never was one
+                if self.label is None:
+                    self.label = UNKNOWN
+                self.expires_at = time.monotonic() + self.retry_after
+            return
+        coords = None
+        if self.resolver is not None:
+            try:
+                coords = self.resolver.resolve(label)
+            except Exception:
+                pass
+        with self.lock:
+            self.label = label
+            self.coords = coords or fallback
+            self.error = None
+            self.expires_at = time.monotonic() + self.ttl
@@ -0,0 +1,344 @@
+import html
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from string import Template
+
+MAP_MODES = ("cluster", "heatmap", "markers")
+
+ATTRIBUTION = "Map data © OpenStreetMap contributors, Esri"
+MAP_STYLES = {
+    "standard": "https://tile.openstreetmap.org/{z}/{x}/{y}.png",
+    "satellite": "https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}",
+    "terrain": "https://server.arcgisonline.com/ArcGIS/rest/services/World_Topo_Map/MapServer/tile/{z}/{y}/{x}",
+}
+
+LEAFLET = ('<link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.css">\n'
+           '<script src="https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.js"></script>')
+MARKER_CLUSTER = (
+    '<link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/leaflet.markercluster/1.1.0/MarkerCluster.css">\n'
+    '<link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/leaflet.markercluster/1.1.0/MarkerCluster.Default.css">\n'
+    '<script src="https://cdnjs.cloudflare.com/ajax/libs/leaflet.markercluster/1.1.0/leaflet.markercluster.js"></script>'
+)
+
+# Above this many distinct locations "markers" mode falls back to clustering
+MAX_PLAIN_MARKERS = 500
+
+# Markers are built in the browser from a compact [lat, lng, count, popup] array rather
+# than one folium.Marker (and one block of generated JavaScript) per point
+_MARKER_CALLBACK = """
+function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {count: row[2]});
+    marker.bindPopup(row[3]);
+    return marker;
+}
+"""
+
+# Label clusters with the number of lookups they hold, not the number of locations
+_CLUSTER_ICON = """
+function (cluster) {
+    var total = 0;
+    cluster.getAllChildMarkers().forEach(function (marker) { total += marker.options.count; });
+    var size = total < 100 ? "small" : total < 1000 ? "medium" : "large";
+    return L.divIcon({
+        html: "<div><span>" + total + "</span></div>",
+        className: "marker-cluster marker-cluster-" + size,
+        iconSize: new L.Point(40, 40)
+    });
+}
+"""
+
+
+def location_popup(count, country, location, numbers, max_chars=300):
+    """Popup HTML for one aggregated location, listing a few numbers and capped at `max_chars`."""
+    title = ", ".join(part for part in (location, country) if part and part != "Not available")
+    lines = [f"<b>{html.escape(title or 'Unknown location')}</b>",
+             f"{count} lookup{'s' if count != 1 else ''}"]
+    used = sum(len(line) for line in lines)
+    shown = 0
+    for number in numbers:
+        line = html.escape(number)
+        if used + len(line) > max_chars:
+            break
+        lines.append(line)
+        used += len(line)
+        shown += 1
+    if count > shown and shown:
+        lines.append(f"... and {count - shown} more")
+    return "<br>".join(lines)
+
+
+def history_map(locations, mode="cluster", popup_chars=300):
+    """Build a folium map from HistoryStore.locations() rows.
+
+    Entries sharing a coordinate arrive already aggregated, so the page holds one point
+    per distinct location with a count; its size depends on the number of places looked
+    up rather than the number of lookups.
+    """
+    import folium
+    from folium import plugins
+
+    if mode not in MAP_MODES:
+        raise ValueError(f"Unknown map mode '{mode}' (choose from {', '.join(MAP_MODES)})")
+    points = [(lat, lng, count, location_popup(count, country, location, numbers, popup_chars))
+              for lat, lng, count, country, location, numbers in locations]
+    if not points:
+        return None
+
+    myMap = folium.Map(location=[points[0][0], points[0][1]], zoom_start=3)
+    if len(points) > 1:
+        lats = [point[0] for point in points]
+        lngs = [point[1] for point in points]
+        myMap.fit_bounds([[min(lats), min(lngs)], [max(lats), max(lngs)]])
+
+    if mode == "heatmap":
+        heaviest = max(point[2] for point in points)
+        plugins.HeatMap([[lat, lng, count / heaviest] for lat, lng, count, _ in points]).add_to(myMap)
+    elif mode == "markers" and len(points) <= MAX_PLAIN_MARKERS:
+        for lat, lng, count, popup in points:
+            folium.Marker([lat, lng], popup=folium.Popup(popup), tooltip=f"{count} lookups",
+                          icon=folium.Icon(color="blue")).add_to(myMap)
+    else:
+        plugins.FastMarkerCluster([list(point) for point in points], callback=_MARKER_CALLBACK,
+                                  icon_create_function=_CLUSTER_ICON).add_to(myMap)
+    return myMap
+
+
+def save_history_map(history, path="history_map.html", mode="cluster", sample=5):
+    """Render `history` to `path`, returning the number of distinct locations drawn (0 if none)."""
+    locations = list(history.locations(sample))
+    myMap = history_map(locations, mode)
+    if myMap is None:
+        return 0
+    myMap.save(path)
+    return len(locations)
+
+
+# The single-number map is a fixed page with the coordinates substituted in, so writing
+# one costs a string format and a file write instead of building and rendering folium objects
+_LOCATION_PAGE = Template("""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>$title</title>
+$leaflet
+<style>html, body, #map { height: 100%; margin: 0; } .secondary-marker { filter: hue-rotate(250deg); }</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+var map = L.map("map").setView([$lat, $lng], $zoom);
+L.tileLayer($tiles, {attribution: $attribution, maxZoom: 19}).addTo(map);
+$markers.forEach(function (m) {
+    var marker = L.marker([m[0], m[1]]).addTo(map).bindPopup(m[2]);
+    if (m[3]) { L.DomUtil.addClass(marker.getElement(), "secondary-marker"); }
+});
+</script>
+</body>
+</html>
+""")
+
+
+def _js(value):
+    # JSON is valid JavaScript; escaping "</" keeps strings from closing the <script> element
+    return json.dumps(value).replace("</", "<\\/")
+
+
+def location_map_html(lat, lng, popup, zoom=9, style="standard", secondary=None):
+    """HTML for a map centred on one marker; `secondary` is an optional (lat, lng, popup) shown in green."""
+    markers = [[lat, lng, html.escape(popup or ""), False]]
+    if secondary:
+        markers.append([secondary[0], secondary[1], html.escape(secondary[2] or ""), True])
+    return _LOCATION_PAGE.substitute(
+        title=html.escape(popup or "Location"), leaflet=LEAFLET, lat=_js(lat), lng=_js(lng), zoom=int(zoom),
+        tiles=_js(MAP_STYLES.get(style, MAP_STYLES["standard"])), attribution=_js(ATTRIBUTION), markers=_js(markers),
+    )
+
+
+def save_location_map(path, result, style="standard", secondary=None):
+    """Write the map for a LookupResult to `path`, replacing it atomically so a browser never sees half a file."""
+    zoom = 9 if result.detailed_location else 5
+    _write_atomic(path, location_map_html(result.lat, result.lng, result.query, zoom, style, secondary))
+    return path
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class LocationMapWriter:
+    """Renders one map per distinct number into `directory`, buffering results like a ResultWriter.
+
+    Each buffer of `buffer_size` results is written by a thread pool of `workers`, so file
+    I/O overlaps; results without coordinates are skipped.
+    """
+
+    def __init__(self, directory, style="standard", workers=4, buffer_size=1000):
+        self.directory = directory
+        self.style = style
+        # An append racing a rebuild would write to the data file being replaced and be lost
+        self.lock = threading.RLock()
+        self.buffer_size = buffer_size
+        self.buffer = {}
+        self.written = 0
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="map")
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, result):
+        return os.path.join(self.directory, f"{(result.e164 or result.number).lstrip('+')}.html")
+
+    def write(self, result):
+        if result.lat is None:
+            return
+        self.buffer[self.path_for(result)] = result
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            list(self.pool.map(lambda item: save_location_map(item[0], item[1], self.style), self.buffer.items()))
+            self.written += len(self.buffer)
+            self.buffer = {}
+
+    def close(self):
+        self.flush()
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_HISTORY_PAGE = Template("""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>Lookup history</title>
+$leaflet
+$marker_cluster
+<style>html, body, #map { height: 100%; margin: 0; }</style>
+<script>
+// Rows from the data file are merged by coordinate: counts add up and the newest
+// numbers are kept, at most $sample per location
+var locations = {}, order = [];
+function add(row) {
+    var key = row[0] + "," + row[1], point = locations[key];
+    if (!point) {
+        point = locations[key] = {lat: row[0], lng: row[1], count: 0, title: row[3], numbers: []};
+        order.push(point);
+    }
+    point.count += row[2];
+    point.numbers = row[4].concat(point.numbers).slice(0, $sample);
+}
+</script>
+<script src="$data_file"></script>
+</head>
+<body>
+<div id="map"></div>
+<script>
+function escapeHtml(text) {
+    var div = document.createElement("div");
+    div.textContent = text;
+    return div.innerHTML;
+}
+var map = L.map("map").setView([20, 0], 2);
+L.tileLayer($tiles, {attribution: $attribution, maxZoom: 19}).addTo(map);
+var cluster = L.markerClusterGroup({iconCreateFunction: $cluster_icon});
+order.forEach(function (p) {
+    var lines = ["<b>" + escapeHtml(p.title) + "</b>", p.count + (p.count == 1 ? " lookup" : " lookups")];
+    p.numbers.forEach(function (n) { lines.push(escapeHtml(n)); });
+    if (p.count > p.numbers.length) { lines.push("... and " + (p.count - p.numbers.length) + " more"); }
+    cluster.addLayer(L.marker([p.lat, p.lng], {count: p.count}).bindPopup(lines.join("<br>")));
+});
+map.addLayer(cluster);
+if (order.length > 1) { map.fitBounds(cluster.getBounds()); }
+else if (order.length) { map.setView([order[0].lat, order[0].lng], 5); }
+</script>
+</body>
+</html>
+""")
+
+
+class HistoryMapFile:
+    """History map kept as a static page plus an append-only data file of points.
+
+    rebuild() writes the page and one aggregated row per location; append() adds one row
+    per new lookup, so recording a lookup never regenerates the map. The page merges rows
+    sharing a coordinate when it loads. Once appends have doubled the data file, the next
+    save() compacts it back to one row per location. Safe to share between threads.
+    """
+
+    def __init__(self, path="history_map.html", data_path=None, sample=5, style="standard"):
+        self.path = path
+        self.data_path = data_path or os.path.splitext(path)[0] + ".data.js"
+        self.sample = sample
+        self.style = style
+        # An append racing a rebuild would write to the data file being replaced and be lost
+        self.lock = threading.RLock()
+
+    def _row(self, lat, lng, count, country, location, numbers):
+        title = ", ".join(part for part in (location, country) if part and part != "Not available")
+        return f"add({_js([lat, lng, count, title or 'Unknown location', numbers[:self.sample]])});\n"
+
+    def rebuild(self, history):
+        """Regenerate the page and data file from the store, returning the number of locations."""
+        with self.lock:
+            rows = [self._row(*location) for location in history.locations(self.sample)]
+            # Header records the compacted size so save() can tell when appends have piled up
+            data = f"// compacted={sum(len(row) for row in rows)}\n" + "".join(rows)
+            _write_atomic(self.data_path, data)
+            _write_atomic(self.path, _HISTORY_PAGE.substitute(
+                leaflet=LEAFLET, marker_cluster=MARKER_CLUSTER, cluster_icon=_CLUSTER_ICON.strip(),
+                sample=int(self.sample), data_file=html.escape(os.path.basename(self.data_path)),
+                tiles=_js(MAP_STYLES.get(self.style, MAP_STYLES["standard"])), attribution=_js(ATTRIBUTION),
+            ))
+            return len(rows)
+
+    def append(self, entry):
+        """Add one history entry; does nothing until the map has been built once."""
+        if entry.get("latitude") is None:
+            return
+        row = self._row(entry["latitude"], entry["longitude"], 1, entry.get("country"),
+                        entry.get("detailed_location"), [entry["number"]])
+        with self.lock:
+            if not os.path.exists(self.data_path):
+                return
+            with open(self.data_path, "a", encoding="utf-8") as f:
+                f.write(row)
+
+    def save(self, history):
+        """Make sure the page is current, rebuilding only if missing or due for compaction.
+
+        Returns False when the history is empty.
+        """
+        with self.lock:
+            if not history:
+                self.reset()
+                return False
+            if self._needs_rebuild():
+                self.rebuild(history)
+            return True
+
+    def _needs_rebuild(self):
+        if not os.path.exists(self.path) or not os.path.exists(self.data_path):
+            return True
+        with open(self.data_path, encoding="utf-8") as f:
+            header = f.readline()
+        if not header.startswith("// compacted="):
+            return True
+        compacted = int(header.split("=", 1)[1])
+        return os.path.getsize(self.data_path) > 2 * compacted + 65536
+
+    def reset(self):
+        with self.lock:
+            for path in (self.data_path, self.path):
+                if os.path.exists(path):
+                    os.remove(path)
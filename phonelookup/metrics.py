@@ -0,0 +1,148 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+
+class StageTimer:
+    """Accumulates wall-clock time and call counts per pipeline stage, plus free-form counters.
+
+    Safe to share between threads (the GUI records from its worker and the Tk thread).
+    """
+
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds, count=1):
+        with self.lock:
+            self.totals[name] = self.totals.get(name, 0.0) + seconds
+            self.counts[name] = self.counts.get(name, 0) + count
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def report(self, processed):
+        elapsed = self.elapsed()
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        lines = [f"Processed {processed} numbers in {elapsed:.2f}s ({rate:.1f} numbers/sec)"]
+        for name, total in self.totals.items():
+            count = self.counts[name]
+            avg_us = total / count * 1e6 if count else 0.0
+            lines.append(f"  {name:<12} {total * 1000:10.1f} ms total  {count:8d} calls  {avg_us:10.1f} us/call")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        with self.lock:
+            stages = {name: {"seconds": round(total, 6), "calls": self.counts[name]}
+                      for name, total in self.totals.items()}
+            return {"elapsed_seconds": round(self.elapsed(), 6), "stages": stages, "counters": dict(self.counters)}
+
+
+class NullTimer:
+    """Stand-in for StageTimer when nobody is collecting timings."""
+
+    def stage(self, name):
+        return nullcontext()
+
+    def add(self, name, seconds, count=1):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def to_dict(self):
+        return {}
+
+
+def format_prometheus(timer, stats=None, prefix="phonelookup"):
+    """Render a StageTimer (and PhoneLookup.stats()) in the Prometheus text exposition format."""
+    data = timer.to_dict()
+    lines = [f"# TYPE {prefix}_stage_seconds_total counter"]
+    lines += [f'{prefix}_stage_seconds_total{{stage="{name}"}} {stage["seconds"]}'
+              for name, stage in data.get("stages", {}).items()]
+    lines.append(f"# TYPE {prefix}_stage_calls_total counter")
+    lines += [f'{prefix}_stage_calls_total{{stage="{name}"}} {stage["calls"]}'
+              for name, stage in data.get("stages", {}).items()]
+    for name, value in data.get("counters", {}).items():
+        lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value}"]
+    for group, values in (stats or {}).items():
+        for name, value in values.items():
+            if value is not None:
+                lines.append(f"{prefix}_{group}_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path, timer, stats=None):
+    """Write metrics to `path`: Prometheus text for .prom/.txt files, JSON otherwise."""
+    if path.endswith((".prom", ".txt")):
+        text = format_prometheus(timer, stats)
+    else:
+        text = json.dumps({**timer.to_dict(), **(stats or {})}, indent=2) + "\n"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+@contextmanager
+def profiled(path=None):
+    """Run the block under cProfile and dump the stats to `path`; does nothing when `path` is None.
+
+    Inspect the output with `python -m pstats PATH` or a viewer such as snakeviz.
+    """
+    if not path:
+        yield
+        return
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+class LatencyWindow:
+    """Keeps the last `size` latencies (in seconds) and reports percentiles over them."""
+
+    def __init__(self, size=10000):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def summary(self, percentiles=(50, 90, 99)):
+        ordered = sorted(self.samples)
+        stats = {"count": self.count}
+        for p in percentiles:
+            stats[f"p{p}_ms"] = _ms(_nearest_rank(ordered, p))
+        stats["max_ms"] = _ms(ordered[-1] if ordered else None)
+        return stats
+
+
+def _nearest_rank(ordered, p):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
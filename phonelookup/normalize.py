@@ -0,0 +1,200 @@
+"""Vectorized clean-up of raw input before it reaches phonenumbers.parse.
+
+Batch feeds are full of formatting noise, repeats and numbers that can't possibly be
+valid. prefilter() handles a whole window of raw strings at once with pandas: it strips
+separators, resolves the country calling code, rejects lengths no number under that code
+can have, and maps every input to a dedup key, so describe_prefiltered() only parses
+each distinct plausible number once. Anything unusual (letters, extensions, non-ASCII
+digits) is passed through for the parser to judge.
+"""
+from collections import deque
+
+import phonenumbers
+from phonenumbers import NumberParseException
+
+from .core import RESULT_FIELDS, LookupResult, describe
+
+# Inputs made only of ASCII digits and common separators, with at most a leading '+'
+_SIMPLE = r"\s*\+?[0-9\s\-.()/]*"
+_SEPARATORS = r"[^0-9]"
+
+# phonenumbers' own bounds on the national significant number
+MIN_NSN = 2
+MAX_NSN = 17
+
+_bounds = None
+
+
+def calling_code_bounds():
+    """Return {calling code (str): (min, max, strips)} for the digits after that code.
+
+    (min, max) are the shortest and longest possible lengths in the metadata. `strips`
+    says the code's main region has a national prefix, which the parser drops even when
+    it is written after the code (as in "+44 (0)20..."), so those lengths are only a
+    rough guide for it.
+    """
+    global _bounds
+    if _bounds is None:
+        bounds = {}
+        for code, regions in phonenumbers.COUNTRY_CODE_TO_REGION_CODE.items():
+            lengths = []
+            for region in regions:
+                metadata = (phonenumbers.PhoneMetadata.metadata_for_nongeo_region(code) if region == "001"
+                            else phonenumbers.PhoneMetadata.metadata_for_region(region))
+                if metadata is not None:
+                    lengths += [length for length in metadata.general_desc.possible_length if length > 0]
+            if lengths:
+                main = phonenumbers.PhoneMetadata.metadata_for_region_or_calling_code(code, regions[0])
+                strips = main is not None and main.national_prefix_for_parsing is not None
+                bounds[str(code)] = (min(lengths), max(lengths), strips)
+        _bounds = bounds
+    return _bounds
+
+
+def _error(error_type, message):
+    return str(NumberParseException(error_type, message))
+
+
+def prefilter(numbers, region=None):
+    """Classify a list of raw numbers in one vectorized pass.
+
+    Returns a DataFrame indexed like `numbers` with columns:
+      key     what to hand to describe() (one per distinct number), or None if rejected
+      status  "parse_error" or "invalid" for rejected inputs, else None
+      error   the parser's message for the rejection
+      e164    the number in E.164 form for inputs rejected as "invalid"
+    """
+    import numpy as np
+    import pandas as pd
+
+    raw = pd.Series(numbers, dtype="object").astype(str)
+    simple = raw.str.fullmatch(_SIMPLE)
+    international = simple & raw.str.lstrip().str.startswith("+")
+    digits = raw.str.replace(_SEPARATORS, "", regex=True)
+    length = digits.str.len()
+    # Very short inputs fail the parser's viability check in ways not worth mirroring here
+    checked = simple & (length >= 3)
+
+    bounds = calling_code_bounds()
+    code = pd.Series(None, index=raw.index, dtype="object")
+    for size in (3, 2, 1):
+        prefix = digits.str[:size]
+        code = code.mask(prefix.isin(bounds), prefix)
+    nsn_length = length - code.str.len().fillna(0).astype(int)
+    known = code.notna()
+    low = code.map({c: b[0] for c, b in bounds.items()})
+    high = code.map({c: b[1] for c, b in bounds.items()})
+    strips = code.map({c: b[2] for c, b in bounds.items()}).fillna(False).astype(bool)
+
+    intl = checked & international
+    # With a default region the parser retries an unrecognised code as that region's
+    # international prefix ("+00..." from ZA), so only reject it when there is none
+    no_code = intl & ~known & (region is None)
+    too_short = intl & known & (nsn_length < MIN_NSN)
+    # A stripped national prefix can bring a long number back under MAX_NSN, so allow
+    # for the longest one (six digits) before rejecting it
+    too_long = intl & known & (nsn_length > MAX_NSN + np.where(strips, 6, 0))
+    # Where nothing can be stripped, the digits after the code are the number itself and
+    # must have one of its possible lengths; anything else is left to the parser
+    impossible = (intl & known & ~strips & (nsn_length >= MIN_NSN) & (nsn_length <= MAX_NSN)
+                  & ((nsn_length < low) | (nsn_length > high)))
+    no_region = checked & ~international & (region is None)
+
+    rejections = [
+        (no_code, "parse_error", _error(NumberParseException.INVALID_COUNTRY_CODE,
+                                        "Could not interpret numbers after plus-sign.")),
+        (too_short, "parse_error", _error(NumberParseException.TOO_SHORT_NSN,
+                                          "The string supplied is too short to be a phone number.")),
+        (too_long, "parse_error", _error(NumberParseException.TOO_LONG,
+                                         "The string supplied is too long to be a phone number.")),
+        (no_region, "parse_error", _error(NumberParseException.INVALID_COUNTRY_CODE,
+                                          "Missing or invalid default region.")),
+        (impossible, "invalid", None),
+    ]
+    masks = [mask.to_numpy(dtype=bool) for mask, _, _ in rejections]
+    rejected = np.logical_or.reduce(masks)
+    # Only inputs this pass has checked get the separator-free key; the rest go to the parser as typed
+    key = np.where(checked, np.where(international, "+" + digits, digits), raw).astype(object)
+    key[rejected] = None
+    e164 = np.where(impossible, "+" + digits, None).astype(object)
+    return pd.DataFrame({
+        "key": key,
+        "status": np.select(masks, [status for _, status, _ in rejections], None).astype(object),
+        "error": np.select(masks, [error for _, _, error in rejections], None).astype(object),
+        "e164": e164,
+    }, index=raw.index, dtype=object)
+
+
+def _copy(result, number):
+    copy = LookupResult(number)
+    for name in RESULT_FIELDS[1:]:
+        setattr(copy, name, getattr(result, name))
+    return copy
+
+
+def describe_prefiltered(numbers, region=None, timer=None, memo=None, workers=1, chunk_size=10000):
+    """Yield a LookupResult per raw number, in input order, parsing only what needs parsing.
+
+    Input is prefiltered `chunk_size` numbers at a time. Rejected inputs become results
+    straight away, and each distinct plausible number is described once, in this
+    process or (with `workers` > 1) in a process pool; repeats, whether in the same
+    chunk or, through `memo`, in an earlier one, get a copy of that result.
+    """
+    from .core import MetadataMemo, _windows
+    from .metrics import NullTimer
+    timer = timer or NullTimer()
+    memo = memo if memo is not None else MetadataMemo()
+    plans = deque()
+
+    def plan(chunk):
+        with timer.stage("prefilter"):
+            frame = prefilter(chunk, region)
+        new = []
+        seen = set()
+        for key in frame["key"]:
+            if key is not None and key not in seen:
+                seen.add(key)
+                if memo.inputs.get((key, region)) is None:
+                    new.append(key)
+        timer.count("prefiltered", len(chunk) - len(new))
+        return chunk, frame, new
+
+    def new_keys():
+        # Plans are queued before their keys are handed out, so the consumer below can
+        # always find the plan a described key belongs to
+        for chunk in _windows(numbers, chunk_size):
+            plans.append(plan(chunk))
+            yield from plans[-1][2]
+
+    if workers > 1:
+        from .parallel import describe_parallel
+        described = describe_parallel(new_keys(), workers, region, timer=timer)
+    else:
+        described = (describe(key, region, timer, memo) for key in new_keys())
+    fresh = {}
+    while True:
+        while not plans:
+            result = next(described, None)
+            if result is None:
+                break
+            fresh[result.number] = result
+        if not plans:
+            # Input and parsing are both exhausted
+            return
+        chunk, frame, new = plans.popleft()
+        for key in new:
+            while key not in fresh:
+                result = next(described)
+                fresh[result.number] = result
+            memo.inputs.put((key, region), fresh.pop(key))
+        for number, key, status, error, e164 in zip(chunk, frame["key"], frame["status"], frame["error"],
+                                                    frame["e164"]):
+            if key is None:
+                yield LookupResult(number, status=status, error=error, e164=e164)
+                continue
+            template = memo.inputs.get((key, region))
+            if template is None:
+                # Only if the memo evicted it since the plan was made
+                template = describe(key, region, timer, memo)
+                memo.inputs.put((key, region), template)
+            yield _copy(template, number)
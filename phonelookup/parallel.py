@@ -0,0 +1,85 @@
+import multiprocessing
+import os
+import sys
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .core import MetadataMemo, _windows, describe, warm_up
+from .metrics import NullTimer, StageTimer
+
+# Per-worker state, set up once by the pool initializer
+_worker_memo = None
+_worker_region = None
+
+
+def _init_worker(region):
+    global _worker_memo, _worker_region
+    from .core import _metadata, enlarge_regex_cache
+    # Already done if the parent warmed up and forked; only spawned workers pay here
+    enlarge_regex_cache()
+    _metadata()
+    _worker_memo = MetadataMemo()
+    _worker_region = region
+
+
+def _describe_chunk(numbers):
+    timer = StageTimer()
+    results = [describe(number, _worker_region, timer, _worker_memo) for number in numbers]
+    return results, timer.totals, timer.counts
+
+
+def _take_done(pending, ordered):
+    if ordered:
+        return [pending.popleft()]
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        pending.remove(future)
+    return done
+
+
+def _pool_context():
+    # Forked workers inherit the parent's loaded metadata. Only Linux forks: macOS
+    # defaults to spawn because forking is unsafe with its system frameworks, so there
+    # (and on Windows) the platform default stands and each worker loads its own
+    if sys.platform.startswith("linux"):
+        return multiprocessing.get_context("fork")
+    return None
+
+
+def describe_parallel(numbers, workers=None, region=None, chunk_size=500, ordered=True, timer=None,
+                      max_pending=None, warm_regions=None):
+    """Run describe() over `numbers` in a process pool, yielding LookupResults.
+
+    Input is sent to workers in chunks of `chunk_size` and at most `max_pending` chunks
+    (default: two per worker) are in flight, so memory stays bounded however long the
+    input is. With `ordered=False` results come back as soon as any chunk finishes.
+    Stage timings from the workers are merged into `timer`.
+
+    Metadata (plus that of `warm_regions` and `region`) is loaded in this process
+    before the pool starts, so forked workers begin warm and share it copy-on-write.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 2
+    pending = deque()
+    if region and warm_regions != "all":
+        warm_regions = list(warm_regions or ()) + [region]
+    with (timer or NullTimer()).stage("warm_up"):
+        warm_up(warm_regions)
+
+    def collect(future):
+        results, totals, counts = future.result()
+        if timer is not None:
+            for name, seconds in totals.items():
+                timer.add(name, seconds, counts[name])
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context(), initializer=_init_worker,
+                             initargs=(region,)) as pool:
+        for chunk in _windows(numbers, chunk_size):
+            pending.append(pool.submit(_describe_chunk, chunk))
+            if len(pending) >= max_pending:
+                for future in _take_done(pending, ordered):
+                    yield from collect(future)
+        while pending:
+            for future in _take_done(pending, ordered):
+                yield from collect(future)
@@ -0,0 +1,228 @@
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from .metrics import LatencyWindow, format_prometheus
+
+MAX_BODY_BYTES = 1 << 20
+MAX_BATCH = 1000
+
+
+class LookupService:
+    """Asynchronous front end to a PhoneLookup that shares work between concurrent requests.
+
+    A request for a number that is already being looked up awaits that lookup instead of
+    starting another, and lookups whose geocoding query is already in flight share its
+    result, so a burst of identical requests costs one upstream call. Cache and geocoder
+    calls run on a thread pool, at most `max_concurrency` at a time, so the event loop
+    only ever does parsing and index reads.
+    """
+
+    def __init__(self, engine, max_concurrency=16):
+        self.engine = engine
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="geocode")
+        self.numbers = {}
+        self.queries = {}
+        self.latency = {"lookup": LatencyWindow(), "batch": LatencyWindow()}
+        self.counters = {"numbers": 0, "coalesced_numbers": 0, "queries": 0, "coalesced_queries": 0}
+
+    async def lookup(self, number, region=None):
+        """Look up one number, joining an identical lookup if one is already running."""
+        self.counters["numbers"] += 1
+        key = (number, region)
+        task = self.numbers.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._lookup(number, region))
+            self.numbers[key] = task
+            task.add_done_callback(lambda _: self.numbers.pop(key, None))
+        else:
+            self.counters["coalesced_numbers"] += 1
+        # Shielded so a client hanging up doesn't cancel a lookup other requests are waiting on
+        return await asyncio.shield(task)
+
+    async def lookup_many(self, numbers, region=None):
+        return await asyncio.gather(*(self.lookup(number, region) for number in numbers))
+
+    async def _lookup(self, number, region):
+        result, query = self.engine.prepare(number, region)
+        if query is None:
+            return result
+        try:
+            coords, source = await self._resolve(query)
+        except Exception as e:
+            return self.engine.finish(result, None, error=e)
+        return self.engine.finish(result, coords, source)
+
+    async def _resolve(self, query):
+        self.counters["queries"] += 1
+        task = self.queries.get(query)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(query))
+            self.queries[query] = task
+            task.add_done_callback(lambda _: self.queries.pop(query, None))
+        else:
+            self.counters["coalesced_queries"] += 1
+        return await asyncio.shield(task)
+
+    async def _fetch(self, query):
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self.engine.resolver.resolve_with_source, query)
+
+    def stats(self):
+        return {
+            "latency": {name: window.summary() for name, window in self.latency.items()},
+            "counters": dict(self.counters),
+            "in_flight": {"numbers": len(self.numbers), "queries": len(self.queries)},
+            **self.engine.stats(),
+        }
+
+    def prometheus(self):
+        stats = self.stats()
+        stats.update({f"latency_{name}": summary for name, summary in stats.pop("latency").items()})
+        return format_prometheus(self.engine.timer, stats)
+
+    async def handle(self, method, target, body):
+        """Route one request, returning (HTTPStatus, payload); str payloads are sent as plain text."""
+        url = urlsplit(target)
+        if url.path == "/lookup":
+            if method != "GET":
+                return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "use GET /lookup?number=..."}
+            params = parse_qs(url.query)
+            if "number" not in params:
+                return HTTPStatus.BAD_REQUEST, {"error": "missing 'number' parameter"}
+            start = time.perf_counter()
+            result = await self.lookup(params["number"][0], params.get("region", [None])[0])
+            self.latency["lookup"].add(time.perf_counter() - start)
+            return HTTPStatus.OK, result.to_dict()
+        if url.path == "/batch":
+            if method != "POST":
+                return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "use POST /batch"}
+            try:
+                request = json.loads(body or b"{}")
+                numbers = request["numbers"]
+                region = request.get("region")
+                if not isinstance(numbers, list) or not all(isinstance(number, str) for number in numbers):
+                    raise TypeError
+            except (ValueError, KeyError, TypeError, AttributeError):
+                return HTTPStatus.BAD_REQUEST, {"error": 'expected {"numbers": ["+1...", ...], "region": optional}'}
+            if len(numbers) > MAX_BATCH:
+                return HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": f"at most {MAX_BATCH} numbers per batch"}
+            start = time.perf_counter()
+            results = await self.lookup_many(numbers, region)
+            self.latency["batch"].add(time.perf_counter() - start)
+            return HTTPStatus.OK, {"results": [result.to_dict() for result in results]}
+        if url.path == "/stats":
+            return HTTPStatus.OK, self.stats()
+        if url.path == "/metrics":
+            return HTTPStatus.OK, self.prometheus()
+        return HTTPStatus.NOT_FOUND, {"error": f"no such endpoint: {url.path}"}
+
+    async def handle_connection(self, reader, writer):
+        # Minimal HTTP/1.1 with keep-alive; enough for service-to-service JSON calls
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                    length = int(headers.get("content-length") or 0)
+                    if length < 0:
+                        raise ValueError
+                except ValueError:
+                    await _respond(writer, HTTPStatus.BAD_REQUEST, {"error": "malformed request"}, False)
+                    break
+                if length > MAX_BODY_BYTES:
+                    await _respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "request body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                try:
+                    status, payload = await self.handle(method, target, body)
+                except Exception as e:
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}
+                await _respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+async def _respond(writer, status, payload, keep_alive):
+    if isinstance(payload, str):
+        data, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+    else:
+        data, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+    head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode("latin-1") + data)
+    await writer.drain()
+
+
+async def serve(engine, host="127.0.0.1", port=8080, max_concurrency=16, ready=None):
+    """Run the lookup service until cancelled; `ready` (if given) is called with the bound port."""
+    service = LookupService(engine, max_concurrency)
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    try:
+        if ready:
+            ready(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def add_arguments(parser):
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on (default: 8080)")
+    parser.add_argument("--max-concurrency", type=int, default=16, help="concurrent cache/geocoder calls (default: 16)")
+    parser.add_argument("--no-geocode", action="store_true", help="skip coordinates, return metadata only")
+    parser.add_argument("--rate", type=float, help="maximum geocoding requests per second")
+    parser.add_argument("--stub-geocoder", action="store_true", help="use a local fake geocoder instead of OpenCage")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="seconds each stub geocoder call takes")
+
+
+def main(args):
+    from .cache import scratch_cache
+    from .core import PhoneLookup, warm_up
+    from .geocode import StubGeocoder
+    from .metrics import StageTimer
+
+    geocoder_api = cache = None
+    if args.stub_geocoder:
+        # Stub coordinates live in memory only, so the real service, CLI and GUI never see them
+        geocoder_api = StubGeocoder(latency=args.stub_latency)
+        cache = scratch_cache()
+    engine = PhoneLookup(geocode=not args.no_geocode, rate=args.rate, timer=StageTimer(), geocoder_api=geocoder_api,
+                         stub_geocoder=args.stub_geocoder, cache=cache)
+    # Load the metadata now so the first request doesn't stall the event loop
+    warm_up(engine.settings.warm_regions)
+    if engine.geocode:
+        engine.resolver
+    ready = lambda port: print(f"Listening on http://{args.host}:{port}", file=sys.stderr)
+    try:
+        asyncio.run(serve(engine, args.host, args.port, args.max_concurrency, ready))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.close()
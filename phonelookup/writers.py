@@ -0,0 +1,218 @@
+import csv
+import json
+import os
+import sys
+from datetime import datetime
+
+# One schema for every export: (key used by NDJSON/Parquet/Arrow, CSV header title)
+SCHEMA = [
+    ("number", "Phone Number"),
+    ("e164", "E.164"),
+    ("status", "Status"),
+    ("country", "Country"),
+    ("detailed_location", "Detailed Location"),
+    ("service_provider", "Service Provider"),
+    ("time_zone", "Time Zone"),
+    ("number_type", "Number Type"),
+    ("region", "Region"),
+    ("latitude", "Latitude"),
+    ("longitude", "Longitude"),
+    ("confidence", "Confidence"),
+    ("source", "Source"),
+    ("ip_location", "IP Location"),
+    ("timestamp", "Timestamp"),
+]
+COLUMNS = [key for key, _ in SCHEMA]
+CSV_HEADER = [title for _, title in SCHEMA]
+
+FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson", ".parquet": "parquet",
+           ".arrow": "arrow", ".feather": "arrow"}
+
+
+def result_row(result, ip_location=None, timestamp=None):
+    """Flatten a LookupResult into a dict following SCHEMA."""
+    confidence = result.confidence
+    return {
+        "number": result.number,
+        "e164": result.e164,
+        "status": result.status,
+        "country": result.country,
+        "detailed_location": result.detailed_location or None,
+        "service_provider": result.service_provider or None,
+        "time_zone": ", ".join(result.time_zone) if result.time_zone else None,
+        "number_type": result.number_type,
+        "region": result.region,
+        "latitude": result.lat,
+        "longitude": result.lng,
+        "confidence": None if confidence is None else str(confidence),
+        "source": result.source,
+        "ip_location": ip_location,
+        "timestamp": timestamp or datetime.now().isoformat(),
+    }
+
+
+class ResultWriter:
+    """Buffers result rows and writes them to one open output in batches of `buffer_size`."""
+
+    def __init__(self, path, buffer_size=1000):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.written = 0
+
+    def write(self, result, ip_location=None):
+        self.write_row(result_row(result, ip_location))
+
+    def write_row(self, row):
+        self.buffer.append(row)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self._write_rows(self.buffer)
+            self.written += len(self.buffer)
+            self.buffer = []
+
+    def _write_rows(self, rows):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _TextWriter(ResultWriter):
+    # Shared by CSV and NDJSON: one handle opened for the whole session, "-" means stdout
+    def __init__(self, path, buffer_size=1000, append=True):
+        super().__init__(path, buffer_size)
+        if path == "-":
+            self.f = sys.stdout
+            self.new_file = True
+        else:
+            self.new_file = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+            self.f = open(path, "a" if append else "w", newline="", encoding="utf-8")
+
+    def flush(self):
+        super().flush()
+        self.f.flush()
+
+    def sync(self):
+        """Flush to disk and return the file size, which ends on a complete row."""
+        self.flush()
+        os.fsync(self.f.fileno())
+        return os.fstat(self.f.fileno()).st_size
+
+    def close(self):
+        self.flush()
+        if self.f is not sys.stdout:
+            self.f.close()
+
+
+class CsvResultWriter(_TextWriter):
+    def __init__(self, path, buffer_size=1000, append=True):
+        if append and path != "-":
+            _retire_mismatched_csv(path)
+        super().__init__(path, buffer_size, append)
+        self.writer = csv.writer(self.f)
+        if self.new_file:
+            self.writer.writerow(CSV_HEADER)
+
+    def _write_rows(self, rows):
+        self.writer.writerows([["" if row[key] is None else row[key] for key in COLUMNS] for row in rows])
+
+
+class NdjsonResultWriter(_TextWriter):
+    def _write_rows(self, rows):
+        self.f.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows))
+
+
+class _ArrowWriter(ResultWriter):
+    # Parquet and Arrow files can't be appended to, so each session writes a new file
+    # and every flush becomes one row group / record batch
+    def __init__(self, path, buffer_size=10000, append=True):
+        super().__init__(_unused_path(path) if append else path, buffer_size)
+        try:
+            import pandas
+            import pyarrow
+        except ImportError as e:
+            raise RuntimeError(f"Writing {path} requires pandas and pyarrow ({e})")
+        self.pandas = pandas
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema(
+            [(key, pyarrow.float64() if key in ("latitude", "longitude") else pyarrow.string()) for key in COLUMNS]
+        )
+        self.sink = None
+
+    def _write_rows(self, rows):
+        if self.sink is None:
+            self.sink = self._open_sink()
+        frame = self.pandas.DataFrame.from_records(rows, columns=COLUMNS)
+        self.sink.write_table(self.pyarrow.Table.from_pandas(frame, schema=self.schema, preserve_index=False))
+
+    def close(self):
+        self.flush()
+        if self.sink is None:
+            # Still produce a valid, empty file so downstream readers don't trip
+            self.sink = self._open_sink()
+        self.sink.close()
+
+
+class ParquetResultWriter(_ArrowWriter):
+    def _open_sink(self):
+        import pyarrow.parquet
+        return pyarrow.parquet.ParquetWriter(self.path, self.schema)
+
+
+class ArrowResultWriter(_ArrowWriter):
+    def _open_sink(self):
+        import pyarrow.ipc
+        return pyarrow.ipc.new_file(self.path, self.schema)
+
+
+WRITERS = {"csv": CsvResultWriter, "ndjson": NdjsonResultWriter, "parquet": ParquetResultWriter,
+           "arrow": ArrowResultWriter}
+
+
+def open_writer(path, format=None, buffer_size=None, append=True):
+    """Open a result writer, picking the format from `format` or the file extension.
+
+    With `append` CSV and NDJSON add to an existing file and Parquet/Arrow pick an unused
+    name next to it; otherwise the file is overwritten.
+    """
+    if format is None:
+        format = FORMATS.get(os.path.splitext(path)[1].lower(), "csv")
+    if format not in WRITERS:
+        raise ValueError(f"Unknown output format '{format}' (choose from {', '.join(WRITERS)})")
+    if path == "-" and format in ("parquet", "arrow"):
+        raise ValueError(f"{format} output needs a file path, not stdout")
+    if buffer_size is None:
+        return WRITERS[format](path, append=append)
+    return WRITERS[format](path, buffer_size, append)
+
+
+def _retire_mismatched_csv(path):
+    # Older versions wrote 8- or 10-column exports; move those aside rather than mixing schemas
+    try:
+        with open(path, newline="", encoding="utf-8") as f:
+            header = next(csv.reader(f), None)
+    except FileNotFoundError:
+        return
+    if header is not None and header != CSV_HEADER:
+        stem, ext = os.path.splitext(path)
+        os.replace(path, _unused_path(f"{stem}.legacy{ext}"))
+
+
+def _unused_path(path):
+    if not os.path.exists(path):
+        return path
+    stem, ext = os.path.splitext(path)
+    n = 1
+    while os.path.exists(f"{stem}.{n}{ext}"):
+        n += 1
+    return f"{stem}.{n}{ext}"
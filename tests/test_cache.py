@@ -0,0 +1,36 @@
+from phonelookup.cache import GeocodeCache
+
+CAPE_TOWN = {"lat": -33.92, "lng": 18.42, "confidence": 9}
+
+
+def test_entries_round_trip_through_the_database(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = GeocodeCache(path)
+    cache["Cape Town, South Africa"] = CAPE_TOWN
+    cache.update({"Durban, South Africa": {"lat": -29.86, "lng": 31.03, "confidence": 8}})
+    assert cache.get("Cape Town, South Africa") == CAPE_TOWN
+
+    reopened = GeocodeCache(path)
+    assert reopened.get("Cape Town, South Africa") == CAPE_TOWN
+    assert reopened["Durban, South Africa"]["lng"] == 31.03
+    assert "Nowhere" not in reopened
+    assert len(reopened) == 2
+
+
+def test_low_confidence_entries_expire_sooner(tmp_path):
+    cache = GeocodeCache(str(tmp_path / "cache.db"), low_confidence_ttl=0, min_confidence=3)
+    cache["Cape Town, South Africa"] = CAPE_TOWN
+    cache["South Africa"] = {"lat": -29.0, "lng": 24.0, "confidence": 1}
+    assert cache.get("Cape Town, South Africa") == CAPE_TOWN
+    assert cache.get("South Africa") is None
+    # Expired entries stay available as a fallback until purged
+    assert cache.get_stale("South Africa")["lat"] == -29.0
+    assert cache.purge_expired() == 1
+    assert cache.get_stale("South Africa") is None
+
+
+def test_expired_entries_are_not_served_from_memory(tmp_path):
+    cache = GeocodeCache(str(tmp_path / "cache.db"), ttl=0)
+    cache["Cape Town, South Africa"] = CAPE_TOWN
+    assert cache.get("Cape Town, South Africa") is None
+    assert len(cache) == 0
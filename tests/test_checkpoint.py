@@ -0,0 +1,48 @@
+import argparse
+import csv
+import os
+
+import pytest
+
+from phonelookup import batch
+from phonelookup.checkpoint import checkpoint_path
+from phonelookup.writers import CSV_HEADER
+
+NUMBERS = [f"+2782{i:07d}" for i in range(500)]
+
+
+def _run(argv):
+    parser = argparse.ArgumentParser()
+    batch.add_arguments(parser)
+    batch.main(parser.parse_args(argv))
+
+
+def _crash_after(count):
+    def read_numbers(source, column=None):
+        for i, number in enumerate(NUMBERS):
+            if i == count:
+                raise RuntimeError("simulated crash")
+            yield number
+    return read_numbers
+
+
+def test_resume_after_crash_writes_each_row_once_in_order(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    source = tmp_path / "numbers.txt"
+    source.write_text("\n".join(NUMBERS) + "\n", encoding="utf-8")
+    output = tmp_path / "results.csv"
+    argv = [str(source), "-o", str(output), "--stub-geocoder", "--window", "50", "--checkpoint-every", "100"]
+
+    with monkeypatch.context() as patch:
+        patch.setattr(batch, "read_numbers", _crash_after(330))
+        with pytest.raises(RuntimeError):
+            _run(argv + ["--checkpoint"])
+    assert os.path.exists(checkpoint_path(str(output)))
+
+    _run(argv + ["--resume"])
+    with open(output, newline="", encoding="utf-8") as f:
+        header, *rows = csv.reader(f)
+    assert header == CSV_HEADER
+    assert [row[0] for row in rows] == NUMBERS
+    assert all(row[2] == "ok" for row in rows)
+    assert not os.path.exists(checkpoint_path(str(output)))
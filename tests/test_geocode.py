@@ -0,0 +1,26 @@
+from phonelookup.cache import scratch_cache
+from phonelookup.geocode import GeocodeResolver, StubGeocoder
+
+
+def test_resolve_many_geocodes_each_distinct_query_once():
+    geocoder = StubGeocoder()
+    resolver = GeocodeResolver(geocoder, scratch_cache())
+    queries = ["Cape Town, South Africa", "Durban, South Africa", "Cape Town, South Africa"] * 3
+    resolved, errors, sources = resolver.resolve_many(queries)
+    assert set(resolved) == set(queries)
+    assert not errors
+    assert sources == {query: "geocoder" for query in set(queries)}
+    assert geocoder.calls == 2
+    assert resolver.requests == 2
+
+
+def test_resolved_queries_are_answered_from_the_cache():
+    geocoder = StubGeocoder()
+    resolver = GeocodeResolver(geocoder, scratch_cache())
+    first, _, _ = resolver.resolve_many(["Cape Town, South Africa"])
+    again, _, sources = resolver.resolve_many(["Cape Town, South Africa"])
+    assert again == first
+    assert sources == {}
+    assert resolver.resolve_with_source("Cape Town, South Africa") == (first["Cape Town, South Africa"], "cache")
+    assert geocoder.calls == 1
+    assert resolver.hits == 2
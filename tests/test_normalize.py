@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip("pandas")
+
+from phonelookup.core import MetadataMemo, describe
+from phonelookup.normalize import describe_prefiltered
+
+
+def _fields(result):
+    return result.to_dict()
+
+
+def test_all_rejected_input_still_yields_a_result_per_number():
+    results = list(describe_prefiltered(["+99912345"]))
+    assert [result.number for result in results] == ["+99912345"]
+    assert results[0].status == "parse_error"
+
+
+def test_rejected_trailing_chunk_is_not_dropped():
+    numbers = ["+27821234567", "+99912345"]
+    results = list(describe_prefiltered(numbers, chunk_size=1))
+    assert [result.number for result in results] == numbers
+
+
+def test_all_repeat_trailing_chunk_is_not_dropped():
+    numbers = ["+27821234567", "+14155552671", "+27 82 123 4567", "+1 415-555-2671"]
+    results = list(describe_prefiltered(numbers, chunk_size=2, memo=MetadataMemo()))
+    assert [result.number for result in results] == numbers
+    assert results[2].e164 == results[0].e164
+    assert results[3].e164 == results[1].e164
+
+
+def test_matches_describe():
+    numbers = ["+27821234567", "+99912345", "0821234567", "+27821234567", "abc", "+1 415 555 2671"]
+    results = list(describe_prefiltered(numbers, region="ZA", chunk_size=4))
+    assert [_fields(result) for result in results] == [_fields(describe(number, "ZA")) for number in numbers]
+
+
+@pytest.mark.parametrize("region", [None, "ZA", "US"])
+@pytest.mark.parametrize("number", ["5-8", "1", "+7", "(0)", "12", "+.00799", "+003-996(", "+-011732 4"])
+def test_short_and_idd_inputs_match_describe(number, region):
+    # Fewer than three digits, or an international prefix written after '+', are left to the parser
+    result, = describe_prefiltered([number], region=region)
+    assert _fields(result) == _fields(describe(number, region))
+
+
+def test_short_input_keeps_parser_error():
+    result, = describe_prefiltered(["5-8"], region="ZA")
+    assert result.status == "parse_error"
+    assert result.e164 is None
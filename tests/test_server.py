@@ -0,0 +1,48 @@
+import asyncio
+
+from phonelookup.cache import scratch_cache
+from phonelookup.core import PhoneLookup
+from phonelookup.geocode import StubGeocoder
+from phonelookup.server import LookupService
+
+
+def _service(monkeypatch, tmp_path, geocoder):
+    # No centroid index in an empty directory, so every lookup needs the geocoder
+    monkeypatch.chdir(tmp_path)
+    engine = PhoneLookup(geocoder_api=geocoder, cache=scratch_cache())
+    return LookupService(engine)
+
+
+def test_identical_requests_share_one_lookup(monkeypatch, tmp_path):
+    geocoder = StubGeocoder(latency=0.05)
+    service = _service(monkeypatch, tmp_path, geocoder)
+
+    async def burst():
+        return await asyncio.gather(*(service.lookup("+27214801234") for _ in range(20)))
+
+    try:
+        results = asyncio.run(burst())
+    finally:
+        service.close()
+    assert {result.status for result in results} == {"ok"}
+    assert len({(result.lat, result.lng) for result in results}) == 1
+    assert geocoder.calls == 1
+    assert service.counters["numbers"] == 20
+    assert service.counters["coalesced_numbers"] == 19
+    assert not service.numbers
+
+
+def test_numbers_sharing_a_query_share_one_geocoder_call(monkeypatch, tmp_path):
+    geocoder = StubGeocoder(latency=0.05)
+    service = _service(monkeypatch, tmp_path, geocoder)
+    numbers = ["+27214801234", "+27214805678", "+27214809999", "not a number"]
+    try:
+        results = asyncio.run(service.lookup_many(numbers))
+    finally:
+        service.close()
+    assert [result.number for result in results] == numbers
+    assert [result.status for result in results] == ["ok", "ok", "ok", "parse_error"]
+    assert geocoder.calls == 1
+    assert service.counters["queries"] == 3
+    assert service.counters["coalesced_queries"] == 2
+    assert not service.queries